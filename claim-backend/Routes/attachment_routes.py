@@ -0,0 +1,451 @@
+from flask import Blueprint, Response, request, jsonify
+from components.dynamoDB import get_claim, add_attachment_to_claim, iter_claims_by_user_id, user_has_claims
+from components.dynamoDB import iter_claims_submitted_between
+from components.s3 import generate_presigned_post, get_signed_url, get_file_metadata
+from components.s3 import ALLOWED_CONTENT_TYPES, MAX_ATTACHMENT_SIZE
+from components.upload_sessions import initiate_upload_session, presign_part_urls, list_uploaded_parts
+from components.upload_sessions import complete_upload_session, abort_upload_session
+from components.s3_stream import stream_upload_to_s3, UploadTooLarge
+from components.attachment_store import reference_existing_blob, store_blob_from_stream
+from components.attachment_store import release_attachment, is_valid_digest
+from components.attachment_store import presign_blob_upload, finalize_staged_blob, is_staging_key
+from components.zip_export import export_entries, stream_zip
+from components.claim_model import unique_filename
+from werkzeug.utils import secure_filename
+from datetime import date, datetime, time, timezone
+
+# creating a blueprint for attachment routes
+attachment_routes = Blueprint('attachment_routes', __name__)
+
+# creating a route that lets the browser upload an attachment straight to S3
+@attachment_routes.route('/presign-post', methods=['POST'])
+def presign_post():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    filename = data.get('filename')
+    content_type = data.get('content_type')
+
+    if not all([user_id, claim_id, filename, content_type]):
+        return jsonify({"error": "user_id, claim_id, filename and content_type are required"}), 400
+
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        return jsonify({"error": f"Content type '{content_type}' is not allowed"}), 400
+
+    if not secure_filename(filename):
+        return jsonify({"error": "filename is not a valid file name"}), 400
+
+    try:
+        # only hand out upload policies for claims that exist and belong to the user
+        claim = get_claim(user_id, claim_id)
+        if claim is None:
+            return jsonify({"error": "Claim not found"}), 404
+
+        presigned_post = generate_presigned_post(user_id, claim_id, _new_attachment_name(claim, filename), content_type)
+        return jsonify({**presigned_post, 'max_size': MAX_ATTACHMENT_SIZE}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to record a direct upload on its claim once the browser has finished it
+@attachment_routes.route('/finalize', methods=['POST'])
+def finalize_upload():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    file_key = data.get('key')
+
+    if not all([user_id, claim_id, file_key]):
+        return jsonify({"error": "user_id, claim_id and key are required"}), 400
+
+    # the key has to be inside the claim's own prefix
+    if not _key_belongs_to_claim(user_id, claim_id, file_key):
+        return jsonify({"error": "Key does not belong to this claim"}), 400
+
+    try:
+        metadata = get_file_metadata(file_key)
+        if metadata is None:
+            return jsonify({"error": "Uploaded file not found"}), 404
+
+        _attach(user_id, claim_id, file_key, metadata['size'], metadata['content_type'])
+        file_url = get_signed_url(file_key)
+
+        return jsonify({'status': 'File attached successfully', 'file_url': file_url, 'size': metadata['size']}), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# check that an upload key lies inside the claim's own prefix
+def _key_belongs_to_claim(user_id, claim_id, file_key):
+    return file_key.startswith(f"{user_id}/{claim_id}/")
+
+# pick the name of a new upload to a claim: its secure file name, suffixed when the claim already
+# has a file of that name, so a second scan.pdf is stored as scan-2.pdf instead of replacing it
+def _new_attachment_name(claim, filename):
+    prefix = f"{claim.user_id}/{claim.claim_id}/"
+    taken = {attachment['key'][len(prefix):] for attachment in claim.attachment_list()
+             if attachment['key'].startswith(prefix)}
+    return unique_filename(secure_filename(filename), taken)
+
+# record an uploaded file and its metadata on its claim
+def _attach(user_id, claim_id, file_key, size, content_type, checksum=None, name=None):
+    add_attachment_to_claim(user_id, claim_id, {
+        'key': file_key,
+        'name': name or file_key.rsplit('/', 1)[-1],
+        'size': size,
+        'content_type': content_type,
+        'checksum': checksum
+    })
+
+# record a shared blob on its claim, giving the blob reference back if it cannot be attached
+def _attach_blob(user_id, claim_id, blob, name):
+    try:
+        _attach(user_id, claim_id, blob['key'], blob['size'], blob['content_type'], blob['sha256'], name)
+    except Exception:
+        release_attachment(user_id, blob['key'])
+        raise
+
+# creating a route that attaches a file the user already stored, given its SHA-256, so a
+# repeated file never has to be uploaded again. For a new file with a content_type, the answer
+# carries a presigned POST the browser uploads it to S3 with, before calling /blobs/finalize
+@attachment_routes.route('/blobs/check', methods=['POST'])
+def check_blob():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    digest = (data.get('sha256') or '').lower()
+    filename = secure_filename(data.get('filename') or '') or None
+    content_type = data.get('content_type')
+
+    if not all([user_id, claim_id, digest]):
+        return jsonify({"error": "user_id, claim_id and sha256 are required"}), 400
+
+    if not is_valid_digest(digest):
+        return jsonify({"error": "sha256 must be a hex encoded SHA-256 digest"}), 400
+
+    if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+        return jsonify({"error": f"Content type '{content_type}' is not allowed"}), 400
+
+    try:
+        blob = reference_existing_blob(user_id, digest)
+        if blob is None:
+            if not content_type:
+                return jsonify({'deduplicated': False}), 200
+            if get_claim(user_id, claim_id) is None:
+                return jsonify({"error": "Claim not found"}), 404
+            upload = presign_blob_upload(user_id, digest, content_type, MAX_ATTACHMENT_SIZE)
+            return jsonify({'deduplicated': False, 'upload': {**upload, 'max_size': MAX_ATTACHMENT_SIZE}}), 200
+
+        _attach_blob(user_id, claim_id, {**blob, 'sha256': digest}, filename)
+        file_url = get_signed_url(blob['key'])
+
+        return jsonify({
+            'status': 'File attached successfully',
+            'deduplicated': True,
+            'file_url': file_url,
+            'size': blob['size']
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to store a new file the browser uploaded straight to S3 after /blobs/check,
+# and record it on its claim
+@attachment_routes.route('/blobs/finalize', methods=['POST'])
+def finalize_blob():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    staging_key = data.get('key')
+    filename = secure_filename(data.get('filename') or '') or None
+
+    if not all([user_id, claim_id, staging_key]):
+        return jsonify({"error": "user_id, claim_id and key are required"}), 400
+
+    # only the user's own staged uploads can be finalized
+    if not is_staging_key(user_id, staging_key):
+        return jsonify({"error": "Key is not an upload of this user"}), 400
+
+    try:
+        blob = finalize_staged_blob(user_id, staging_key)
+        if blob is None:
+            return jsonify({"error": "Uploaded file not found"}), 404
+
+        _attach_blob(user_id, claim_id, blob, filename)
+        file_url = get_signed_url(blob['key'])
+
+        return jsonify({
+            'status': 'File attached successfully',
+            'file_url': file_url,
+            'size': blob['size'],
+            'sha256': blob['sha256'],
+            'deduplicated': blob['deduplicated']
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to start a resumable multipart upload session for a large attachment
+@attachment_routes.route('/sessions', methods=['POST'])
+def create_upload_session():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    filename = data.get('filename')
+    content_type = data.get('content_type')
+    size = data.get('size')
+
+    if not all([user_id, claim_id, filename, content_type, size]):
+        return jsonify({"error": "user_id, claim_id, filename, content_type and size are required"}), 400
+
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        return jsonify({"error": f"Content type '{content_type}' is not allowed"}), 400
+
+    if not secure_filename(filename):
+        return jsonify({"error": "filename is not a valid file name"}), 400
+
+    try:
+        claim = get_claim(user_id, claim_id)
+        if claim is None:
+            return jsonify({"error": "Claim not found"}), 404
+
+        session = initiate_upload_session(user_id, claim_id, _new_attachment_name(claim, filename),
+                                          content_type, int(size))
+        return jsonify(session), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to hand out presigned URLs for some parts of an upload session
+@attachment_routes.route('/sessions/parts', methods=['POST'])
+def get_upload_part_urls():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    file_key = data.get('key')
+    upload_id = data.get('upload_id')
+    size = data.get('size')
+    part_numbers = data.get('part_numbers')
+
+    if not all([user_id, claim_id, file_key, upload_id, size, part_numbers]):
+        return jsonify({"error": "user_id, claim_id, key, upload_id, size and part_numbers are required"}), 400
+
+    if not _key_belongs_to_claim(user_id, claim_id, file_key):
+        return jsonify({"error": "Key does not belong to this claim"}), 400
+
+    try:
+        urls = presign_part_urls(file_key, upload_id, int(size), [int(number) for number in part_numbers])
+        return jsonify({'parts': urls}), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to see which parts have been uploaded, so a client can resume
+@attachment_routes.route('/sessions/status', methods=['GET'])
+def get_upload_session_status():
+    user_id = request.args.get('user_id')
+    claim_id = request.args.get('claim_id')
+    file_key = request.args.get('key')
+    upload_id = request.args.get('upload_id')
+
+    if not all([user_id, claim_id, file_key, upload_id]):
+        return jsonify({"error": "user_id, claim_id, key and upload_id are required"}), 400
+
+    if not _key_belongs_to_claim(user_id, claim_id, file_key):
+        return jsonify({"error": "Key does not belong to this claim"}), 400
+
+    try:
+        parts = list_uploaded_parts(file_key, upload_id)
+        if parts is None:
+            return jsonify({"error": "Upload session not found"}), 404
+
+        return jsonify({'parts': parts}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to complete an upload session and record the file on its claim
+@attachment_routes.route('/sessions/complete', methods=['POST'])
+def complete_session():
+    data = request.json
+    user_id = data.get('user_id')
+    claim_id = data.get('claim_id')
+    file_key = data.get('key')
+    upload_id = data.get('upload_id')
+    size = data.get('size')
+
+    if not all([user_id, claim_id, file_key, upload_id, size]):
+        return jsonify({"error": "user_id, claim_id, key, upload_id and size are required"}), 400
+
+    if not _key_belongs_to_claim(user_id, claim_id, file_key):
+        return jsonify({"error": "Key does not belong to this claim"}), 400
+
+    try:
+        size = complete_upload_session(file_key, upload_id, int(size))
+
+        metadata = get_file_metadata(file_key)
+        _attach(user_id, claim_id, file_key, size, metadata and metadata['content_type'])
+        file_url = get_signed_url(file_key)
+
+        return jsonify({'status': 'File attached successfully', 'file_url': file_url, 'size': size}), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route to abort an upload session
+@attachment_routes.route('/sessions', methods=['DELETE'])
+def abort_session():
+    user_id = request.args.get('user_id')
+    claim_id = request.args.get('claim_id')
+    file_key = request.args.get('key')
+    upload_id = request.args.get('upload_id')
+
+    if not all([user_id, claim_id, file_key, upload_id]):
+        return jsonify({"error": "user_id, claim_id, key and upload_id are required"}), 400
+
+    if not _key_belongs_to_claim(user_id, claim_id, file_key):
+        return jsonify({"error": "Key does not belong to this claim"}), 400
+
+    try:
+        abort_upload_session(file_key, upload_id)
+        return jsonify({'status': 'Upload session aborted'}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# creating a route that streams the raw request body into S3 while it is being received
+@attachment_routes.route('/stream', methods=['PUT', 'POST'])
+def stream_upload():
+    user_id = request.args.get('user_id')
+    claim_id = request.args.get('claim_id')
+    filename = request.args.get('filename')
+    content_type = request.mimetype
+    dedupe = request.args.get('dedupe', 'false').lower() == 'true'
+
+    if not all([user_id, claim_id, filename]):
+        return jsonify({"error": "user_id, claim_id and filename are required"}), 400
+
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        return jsonify({"error": f"Content type '{content_type}' is not allowed"}), 400
+
+    if not secure_filename(filename):
+        return jsonify({"error": "filename is not a valid file name"}), 400
+
+    # reject oversized uploads up front when the client announces the size
+    if request.content_length is not None and request.content_length > MAX_ATTACHMENT_SIZE:
+        return jsonify({"error": f"File exceeds {MAX_ATTACHMENT_SIZE} bytes"}), 413
+
+    try:
+        claim = get_claim(user_id, claim_id)
+        if claim is None:
+            return jsonify({"error": "Claim not found"}), 404
+
+        # request.stream is the raw body, so werkzeug never spools it to a temporary file
+        if dedupe:
+            # hashed while it arrives and stored once per user, however many claims use it
+            upload = store_blob_from_stream(user_id, request.stream, content_type, MAX_ATTACHMENT_SIZE)
+            file_key = upload['key']
+            _attach_blob(user_id, claim_id, upload, secure_filename(filename))
+        else:
+            file_key = f"{user_id}/{claim_id}/{_new_attachment_name(claim, filename)}"
+            upload = stream_upload_to_s3(request.stream, file_key, content_type, max_size=MAX_ATTACHMENT_SIZE)
+            _attach(user_id, claim_id, file_key, upload['size'], content_type, upload['sha256'])
+        file_url = get_signed_url(file_key)
+
+        return jsonify({
+            'status': 'File attached successfully',
+            'file_url': file_url,
+            'size': upload['size'],
+            'sha256': upload['sha256'],
+            'deduplicated': upload.get('deduplicated', False)
+        }), 200
+
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# function to read the optional submitted_from / submitted_to (YYYY-MM-DD, UTC, inclusive) query
+# parameters into a datetime range, or None when neither is given
+def submission_range(args):
+    submitted_from = args.get('submitted_from')
+    submitted_to = args.get('submitted_to')
+    if not submitted_from and not submitted_to:
+        return None
+
+    try:
+        start = date.fromisoformat(submitted_from) if submitted_from else date(1970, 1, 1)
+        end = date.fromisoformat(submitted_to) if submitted_to else datetime.now(timezone.utc).date()
+    except ValueError:
+        raise ValueError("submitted_from and submitted_to must be dates in YYYY-MM-DD format")
+    if start > end:
+        raise ValueError("submitted_from must not be after submitted_to")
+    return datetime.combine(start, time.min, timezone.utc), datetime.combine(end, time.max, timezone.utc)
+
+# creating a route that downloads every attachment of a claim, or a user's full data export
+# (optionally only the claims submitted in a date range), as one zip archive streamed straight from S3
+@attachment_routes.route('/export', methods=['GET'])
+def export_attachments():
+    user_id = request.args.get('user_id')
+    claim_id = request.args.get('claim_id')
+
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+
+    try:
+        submitted = submission_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if claim_id:
+            claim = get_claim(user_id, claim_id)
+            if claim is None:
+                return jsonify({"error": "Claim not found"}), 404
+            entries = export_entries([claim], folder_per_claim=False)
+            filename = f"claim-{claim_id}.zip"
+        else:
+            if not user_has_claims(user_id):
+                return jsonify({"message": "No claims found for this user."}), 404
+            # claims are paged in from DynamoDB while the archive is being sent; a date range is a
+            # key condition on the time-ordered claim IDs, so claims outside it are never read
+            if submitted:
+                claims = iter_claims_submitted_between(user_id, *submitted, newest_first=False)
+            else:
+                claims = iter_claims_by_user_id(user_id, newest_first=False)
+            entries = export_entries(claims)
+            filename = "claimsure-export.zip"
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # the status line is sent before the archive is built, so errors after this point can only
+    # end the download early
+    return Response(
+        stream_zip(entries),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
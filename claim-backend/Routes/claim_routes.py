@@ -1,9 +1,17 @@
-from flask import Blueprint, request, jsonify
-from claims_lib import generate_unique_claim_id
-from components.dynamoDB import add_claim_to_dynamoDB, get_claims_by_user_id, update_claim_in_dynamoDB, delete_claim_from_dynamoDB
-from components.s3 import upload_file_to_s3, generate_presigned_url
-from werkzeug.utils import secure_filename
-from claims_lib.claims_due_count import count_claims_due_in_next_days
+import hashlib
+import time
+from datetime import datetime, timezone
+from flask import Blueprint, Response, abort, current_app, request, jsonify
+from components.claim_ids import generate_claim_id
+from components.dynamoDB import get_claims_by_user_id, update_claim_in_dynamoDB, delete_claim_from_dynamoDB
+from components.dynamoDB import get_claim_summary, get_claims_version, claims_cache
+from components.dynamoDB import compute_claim_summary, count_claims_due_by_user_id, user_has_claims
+from components.dynamoDB import get_claim_changes, new_sync_token
+from components.single_flight import claim_reads
+from components.claim_model import CLAIM_JSON_VERSION, MAX_ATTACHMENTS_PER_CLAIM, unmarshal
+from components.attachment_gc import enqueue_claim_cleanup
+from components.claim_submission import submit_claim_pipeline
+from components.s3 import get_signed_url, SIGNED_URL_REFRESH_MARGIN
 
 # creating a blueprint for claim routes
 claim_routes = Blueprint('claim_routes', __name__) 
@@ -21,46 +29,147 @@ def submit_claim():
     if not user_id or not claim_title or not claim_type or not claim_details:
         return jsonify({"error": "All fields are required"}), 400
 
-    # generate unique Claim ID
-    claim_id = generate_unique_claim_id()
+    # generate unique, time-ordered Claim ID
+    claim_id = generate_claim_id()
 
-    # if no files are uploaded set file url to none
-    file_url = None
-
-    # if there is a file in the request, upload it to S3 and get the URL
-    if 'file' in request.files:
-        file = request.files['file']
-        file_url = upload_file_to_s3(user_id, claim_id, file)  
-
-        # for accessing the file create a temporary secure link
-        file_url = generate_presigned_url(user_id, claim_id, secure_filename(file.filename))
-
-    # save claim data into DynamoDB
-    add_claim_to_dynamoDB(user_id, claim_id, claim_title, claim_type, claim_details, file_url)
+    # files in the request are uploaded to S3 in parallel while the claim is saved into DynamoDB
+    files = [file for file in request.files.getlist('file') if file.filename]
+    if len(files) > MAX_ATTACHMENTS_PER_CLAIM:
+        return jsonify({"error": f"A claim can have at most {MAX_ATTACHMENTS_PER_CLAIM} attachments"}), 400
 
+    try:
+        attachments = submit_claim_pipeline(user_id, claim_id, claim_title, claim_type, claim_details, files)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-    return jsonify({'status': 'Claim submitted successfully', 'claim_id': claim_id, 'file_url': file_url}), 200
+    attachments = [attachment_to_json(attachment) for attachment in attachments]
+    return jsonify({
+        'status': 'Claim submitted successfully',
+        'claim_id': claim_id,
+        'file_url': attachments[0]['url'] if attachments else None,
+        'attachments': attachments
+    }), 200
+
+# function to turn attachment metadata into JSON with a fresh (cached) download URL
+def attachment_to_json(attachment):
+    result = {name: attachment[name] for name in ('name', 'size', 'content_type', 'checksum') if attachment.get(name)}
+    result['url'] = get_signed_url(attachment['key'])
+    return result
+
+# function to turn a claim into its JSON form, file_url is kept for clients that show one file
+def claim_to_json(claim):
+    result = claim.to_json()
+    attachments = claim.attachment_list()
+    if attachments:
+        result['attachments'] = [attachment_to_json(attachment) for attachment in attachments]
+        result['file_url'] = result['attachments'][0]['url']
+    return result
+
+# claim lists carry presigned download URLs, which have at least SIGNED_URL_REFRESH_MARGIN left
+# when handed out; their ETag also changes every half of that, so a client revalidating a
+# cached list never keeps URLs that are about to expire
+SIGNED_URL_ETAG_WINDOW = SIGNED_URL_REFRESH_MARGIN // 2
+
+# function to derive a strong ETag from the user's claims version and everything else the body
+# depends on (the route, page parameters, ...)
+def claims_etag(version, *parts):
+    value = "|".join(str(part) for part in (CLAIM_JSON_VERSION, version) + parts)
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+# function to answer a request whose If-None-Match holds the current ETag, without a body
+def not_modified(etag):
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+# function to let clients cache a response and revalidate it with its ETag on every use
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# page size limits for the get-claims route
+DEFAULT_CLAIMS_PAGE_SIZE = 50
+MAX_CLAIMS_PAGE_SIZE = 100
+
+# function to answer get-claims?since=<sync token> with the claims written and the IDs of the
+# claims deleted after the token, and the token to send next time
+def claim_changes_response(user_id, sync_token):
+    changes = get_claim_changes(user_id, sync_token)
+    if changes is None:
+        # deletions that old are forgotten, the client has to read all claims again
+        return jsonify({"version": CLAIM_JSON_VERSION, "reset": True}), 200
+
+    claims, deleted, next_token = changes
+    return jsonify({
+        "version": CLAIM_JSON_VERSION,
+        "reset": False,
+        "claims": [claim_to_json(claim) for claim in claims],
+        "deleted": deleted,
+        "sync_token": next_token
+    }), 200
 
 # creating a route to get claim
 @claim_routes.route('/get-claims', methods=['GET'])
 def get_claims():
-    # get user_id from query parameters
+    # get user_id, page size, cursor and sort order from query parameters
     user_id = request.args.get('user_id')
+    cursor = request.args.get('cursor')
+    order = request.args.get('order', 'newest')
+    since = request.args.get('since')
 
     # check if user_id is provided
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
+    # delta sync: only what changed after a token from an earlier response
+    if since is not None:
+        try:
+            return claim_changes_response(user_id, since)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
     try:
-        # fetch claims from DynamoDB by user_id
-        claims = get_claims_by_user_id(user_id)
+        limit = int(request.args.get('limit', DEFAULT_CLAIMS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
 
-    
-        if not claims:
-            return jsonify({"message": "No claims found for this user."}), 404
+    if limit < 1 or limit > MAX_CLAIMS_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_CLAIMS_PAGE_SIZE}"}), 400
 
-        
-        return jsonify({"claims": claims}), 200
+    if order not in ('newest', 'oldest'):
+        return jsonify({"error": "order must be 'newest' or 'oldest'"}), 400
+
+    try:
+        # the first page starts the client's delta sync; the token is taken before reading
+        sync_token = None if cursor else new_sync_token(user_id)
+
+        # a single small read tells whether the client's copy is still current
+        version = get_claims_version(user_id)
+        etag = claims_etag(version, 'get-claims', limit, cursor, order, int(time.time() // SIGNED_URL_ETAG_WINDOW))
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
+        # fetch one page of claims from DynamoDB by user_id with a key-condition query
+        claims, next_cursor = get_claims_by_user_id(user_id, limit=limit, cursor=cursor,
+                                                    newest_first=(order == 'newest'), version=version)
+
+        # only the first page can tell that the user has no claims at all
+        if not claims and not cursor:
+            return jsonify({"message": "No claims found for this user.", "sync_token": sync_token}), 404
+
+        result = {
+            "version": CLAIM_JSON_VERSION,
+            "claims": [claim_to_json(claim) for claim in claims],
+            "next_cursor": next_cursor
+        }
+        if sync_token:
+            result["sync_token"] = sync_token
+        return with_etag(jsonify(result), etag), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -100,7 +209,14 @@ def delete_claim():
 
     try:
         # try deleting the claim from Dynamodb using user_id and claim_id
-        delete_claim_from_dynamoDB(user_id, claim_id)
+        response = delete_claim_from_dynamoDB(user_id, claim_id)
+
+        # the claim's files are removed in the background; a file shared with other claims is
+        # only deleted with its last claim
+        deleted_item = response.get('Attributes')
+        if deleted_item:
+            attachment_keys = [attachment['key'] for attachment in unmarshal(deleted_item).attachment_list()]
+            enqueue_claim_cleanup(user_id, claim_id, attachment_keys)
         return jsonify({'status': 'Claim deleted successfully'}), 200
 
     except Exception as e:
@@ -116,16 +232,56 @@ def get_claims_due_in_next_30_days():
         return jsonify({"error": "User ID is required"}), 400
 
     try:
-        # Fetch claims from DynamoDB by user_id
-        claims = get_claims_by_user_id(user_id)
-
-        if not claims:
+        # the due window moves with the date, so the ETag does too
+        version = get_claims_version(user_id)
+        etag = claims_etag(version, 'count-due', datetime.now(timezone.utc).date().isoformat())
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
+        # read the counters maintained from the claims stream with a single GetItem
+        summary = get_claim_summary(user_id)
+
+        if summary is None:
+            # not counted by the stream consumer yet, count on the due-date index instead
+            if not user_has_claims(user_id):
+                return jsonify({"message": "No claims found for this user."}), 404
+            due_claims = count_claims_due_by_user_id(user_id, 30)
+        elif not summary['total_claims']:
             return jsonify({"message": "No claims found for this user."}), 404
+        else:
+            due_claims = summary['due_in_next_30_days']
+
+        return with_etag(jsonify({'claims_due_in_next_30_days': due_claims}), etag), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# creating a route to get the dashboard summary of a user's claims
+@claim_routes.route('/summary', methods=['GET'])
+def get_summary():
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        # users the stream consumer has not counted yet are counted from the claims table
+        summary = get_claim_summary(user_id) or compute_claim_summary(user_id)
 
-        # Call the function from the library to count claims that are due in the next 30 days
-        claims_due_count = count_claims_due_in_next_days(claims, 30)
+        if not summary['total_claims']:
+            return jsonify({"message": "No claims found for this user."}), 404
 
-        return jsonify({'claims_due_in_next_30_days': claims_due_count}), 200
+        return jsonify(summary), 200
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+# creating a route to inspect the claim cache and read coalescing of this worker; it is not
+# authenticated, so it only exists in apps created with DEBUG_ROUTES
+@claim_routes.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    if not current_app.config.get('DEBUG_ROUTES'):
+        abort(404)
+    return jsonify({**claims_cache.stats(), 'single_flight': dict(claim_reads.stats)}), 200
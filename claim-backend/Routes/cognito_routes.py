@@ -1,19 +1,18 @@
 from flask import Blueprint, request, jsonify
-from components.cognito import create_user_pool, create_app_client, register_user, login_user, logout_user
-import boto3
+from components.cognito import register_user, login_user, logout_user
 from botocore.exceptions import ClientError
 from components.cognito import initiate_password_reset, confirm_password_reset
+from components.aws_clients import client_proxy
+from components.resources import get_resource
 
 # define the blueprint for authentication routes
 cognito_routes = Blueprint('cognito_routes', __name__)
 
-# AWS Cognito client (need to ensure region and credentials are correct)
-cognito_client = boto3.client('cognito-idp', region_name='us-east-1')
+# shared AWS Cognito client, the same one components.cognito uses
+cognito_client = client_proxy('cognito-idp')
 
-# create new Cognito user pool to manage users
-user_pool_name = "claimSure-user-pool"
-user_pool_id = create_user_pool(user_pool_name)
-app_client_id = create_app_client(user_pool_id, "my_app_client")
+# the user pool and app client are created by `python provision.py apply`, their IDs are
+# resolved on the first request instead of at import
 
 @cognito_routes.route('/register', methods=['POST'])
 def register():
@@ -27,7 +26,7 @@ def register():
             return jsonify({"error": "Missing email or password"}), 400
 
         # register the user using Cognito
-        register_response = register_user(app_client_id, user_pool_id, email, password)
+        register_response = register_user(get_resource('app_client_id'), get_resource('user_pool_id'), email, password)
 
         # check if there was an error in the registration 
         if 'error' in register_response:
@@ -57,7 +56,7 @@ def login():
             return jsonify({"error": "Missing email or password"}), 400
 
         # log in the user using Cognito 
-        auth_result, user_id = login_user(app_client_id, email, password)  
+        auth_result, user_id = login_user(get_resource('app_client_id'), email, password)  
 
         if auth_result:
             # if successful, return login tokens and user ID to frontend
@@ -101,7 +100,7 @@ def forgot_password():
             return jsonify({"error": "Missing email"}), 400
 
         # Initiate password reset using Cognito and app_client_id
-        response = initiate_password_reset(app_client_id, email)
+        response = initiate_password_reset(get_resource('app_client_id'), email)
 
         # If successful, return success message
         if 'error' in response:
@@ -127,7 +126,7 @@ def reset_password():
         new_password = data.get('newPassword', '').strip()
 
         # Call the function to confirm the password reset with the provided data
-        response = confirm_password_reset(app_client_id, email, otp, new_password)
+        response = confirm_password_reset(get_resource('app_client_id'), email, otp, new_password)
         if 'error' in response:
             return jsonify({"error": response['error']}), 500
 
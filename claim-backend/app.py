@@ -1,65 +1,75 @@
-from flask import Flask, send_from_directory
-from flask_cors import CORS
-from Routes.cognito_routes import cognito_routes
-from Routes.claim_routes import claim_routes
-from components.cognito import create_user_pool, create_app_client
-from components.dynamoDB import create_table, create_event_source_mapping
-from components.s3 import create_s3_bucket
-from components.lambda_fun import create_lambda_function
-from components.sns import create_sns_topic
 import os
+from flask import Flask
+from flask_cors import CORS
+from components.static_assets import load_assets, serve_asset
+
+# settings create_app() starts from; a deployment (or a script) passes its own to override them
+DEFAULT_CONFIG = {
+    'STATIC_FOLDER': 'build',          # react build served next to the API
+    'START_UPLOAD_JANITOR': True,      # abort multipart uploads abandoned by their clients
+    'DEBUG_ROUTES': False,             # unauthenticated diagnostics such as /claims/cache-stats
+}
+
+
+# function to build the flask app. Importing this module stays cheap: the routes (and through
+# them claims_lib and jwt) are imported here, and boto3 only when the first AWS client is
+# created, so a worker is ready to accept requests without loading the AWS SDK first.
+# AWS resources are created by `python provision.py apply`, not when a worker starts; their IDs
+# are read from the manifest or environment it writes, or looked up once on first use
+def create_app(config=None):
+    settings = dict(DEFAULT_CONFIG)
+    settings.update(config or {})
+
+    # create flask app; the react build is served by serve_react_app below, so flask's own
+    # /<static folder>/<path> route is not registered
+    app = Flask(__name__, static_folder=None)
+    app.config.update(settings)
+
+    # enable (CORS) for front end and backend communication
+    CORS(app)
+
+    from Routes.cognito_routes import cognito_routes
+    from Routes.claim_routes import claim_routes
+    from Routes.attachment_routes import attachment_routes
+
+    # register routes for Cognito, Claim and attachments
+    app.register_blueprint(cognito_routes, url_prefix='/auth')
+    app.register_blueprint(claim_routes, url_prefix='/claims')
+    app.register_blueprint(attachment_routes, url_prefix='/attachments')
+
+    if settings['START_UPLOAD_JANITOR']:
+        from components.upload_sessions import start_upload_janitor
+        start_upload_janitor()
+
+    # the react build is read into memory once (shared by the workers of serve.py), with
+    # compressed variants, ETags and cache headers; a new build needs a restart or reload
+    build_dir = settings['STATIC_FOLDER']
+    if build_dir:
+        build_dir = os.path.join(app.root_path, build_dir)
+    assets = load_assets(build_dir)
+
+    # serve the react static files to start frontend
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve_react_app(path):
+        # files of the build are served from the manifest, every other path gets index.html
+        return serve_asset(assets, path)
+
+    return app
+
+
+# `app:app` (e.g. for a WSGI server) still works: the app is created the first time it is asked for
+_app = None
+
+def __getattr__(name):
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# create flask app to build static files
-app = Flask(__name__, static_folder='build')
-
-# enable (CORS) for front end and backend communication
-CORS(app)
-
-# create Cognito resources user pool to manage user authentication when app starts
-user_pool_name = "claimSure-user-pool"
-user_pool_id = create_user_pool(user_pool_name)
-app_client_id = create_app_client(user_pool_id, "my_app_client")
-
-# create DynamoDB table if it doesn't exist to store claims data
-table_name = "ClaimsTable"
-create_table(table_name)
-
-# create S3 bucket for storing uploaded files
-bucket_name = "claimsure-app-bucket-cpp"
-response = create_s3_bucket(bucket_name)
-print(response)
-
-topic_arn = create_sns_topic("ClaimSubmissionTopic")
-
-# setup Lambda function 
-function_name = "claimsure-email-report"
-role_arn = "arn:aws:iam::298550657963:role/LabRole"  # permission for making Lambda work
-handler = "lambda_function.lambda_handler"  # lambda handler function 
-
-# create the Lambda function 
-lambda_response = create_lambda_function(function_name, role_arn, handler)
-if lambda_response:
-    print("Lambda function created successfully.")
-else:
-    print("Failed to create Lambda function.")
-
-# connecting Lambda with Dynamodb table
-create_event_source_mapping("claimsure-email-report", "ClaimsTable")
-
-# register routes for Cognito and Claim 
-app.register_blueprint(cognito_routes, url_prefix='/auth')
-app.register_blueprint(claim_routes, url_prefix='/claims')
-
-# serve the react static files to start frontend
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve_react_app(path):
-    # check if the requested file exists in the build folder, serve it
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    else:
-        # if file does not exist, serve the index.html for all other requests
-        return send_from_directory(app.static_folder, 'index.html')
 
+# development server with the debugger, serve with `python serve.py` everywhere else
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app({'DEBUG_ROUTES': True}).run(debug=True, host='0.0.0.0', port=5000)
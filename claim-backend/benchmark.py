@@ -0,0 +1,162 @@
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Measures throughput and latency of the app under serve.py for several worker/thread counts,
+# which is where the sizing guidance in serve.py comes from:
+#
+#   python benchmark.py [--configs 1x1,1x8,1x16,2x8,4x8] [--concurrency 32] [--duration 15]
+#                       [--path "/claims/get-claims?user_id=...&limit=20"]
+#   python benchmark.py --url http://host:8000   # load an already running server instead
+#   python benchmark.py --seed 200                # first write 200 claims for benchmark-user
+#
+# Point it at the real AWS account (or set AWS_ENDPOINT_URL to a local emulator) with some
+# claims under the user: most of a request is spent waiting on DynamoDB, which is what the
+# thread count has to cover.
+
+BENCHMARK_USER = "benchmark-user"
+DEFAULT_PATH = f"/claims/get-claims?user_id={BENCHMARK_USER}&limit=20"
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise Exception(f"Error: server on {host}:{port} did not start within {timeout}s")
+
+
+# function to write `count` claims for the benchmark user, with IDs drawn in one batch
+def seed_claims(count):
+    sys.path.insert(0, BACKEND_DIR)
+    from components.claim_ids import generate_claim_ids
+    from components.dynamoDB import add_claim_to_dynamoDB
+
+    for number, claim_id in enumerate(generate_claim_ids(count), 1):
+        add_claim_to_dynamoDB(BENCHMARK_USER, claim_id, f"Benchmark claim {number}", "benchmark",
+                              "Written by benchmark.py --seed")
+    print(f"Seeded {count} claims for {BENCHMARK_USER}")
+
+
+# function to send requests from `concurrency` keep-alive connections for `duration` seconds;
+# returns the latencies of the successful requests and the number of failed ones
+def run_load(base_url, path, concurrency, duration):
+    url = urlsplit(base_url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def connect():
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+
+    def client():
+        own_latencies = []
+        own_errors = 0
+        connection = connect()
+        reused = False
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                except (OSError, http.client.HTTPException):
+                    if not reused:
+                        raise
+                    # a worker being replaced closes its idle keep-alive connections; like
+                    # browsers and proxies, retry a GET once on a fresh connection
+                    connection.close()
+                    connection = connect()
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                response.read()
+                reused = True
+                if response.status < 500:
+                    own_latencies.append(time.perf_counter() - started)
+                else:
+                    own_errors += 1
+            except (OSError, http.client.HTTPException):
+                own_errors += 1
+                connection.close()
+                connection = connect()
+                reused = False
+        connection.close()
+        with lock:
+            latencies.extend(own_latencies)
+            errors[0] += own_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _report_line(label, latencies, errors, duration):
+    latencies.sort()
+    print(f"{label:<10} {len(latencies) / duration:>9.1f} {_percentile(latencies, 0.5) * 1000:>8.1f} "
+          f"{_percentile(latencies, 0.95) * 1000:>8.1f} {_percentile(latencies, 0.99) * 1000:>8.1f} {errors:>7}")
+
+
+# function to start serve.py with some workers and threads, load it and stop it again
+def benchmark_config(workers, threads, port, path, concurrency, duration, warmup):
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+         "--threads", str(threads), "--pid-file", f"/tmp/claimsure-benchmark-{port}.pid"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port("127.0.0.1", port)
+        base_url = f"http://127.0.0.1:{port}"
+        run_load(base_url, path, concurrency, warmup)  # first calls create connections and fill caches
+        return run_load(base_url, path, concurrency, duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ClaimSure under serve.py.")
+    parser.add_argument('--configs', default="1x1,1x8,1x16,2x8,4x8",
+                        help="comma separated WORKERSxTHREADS to start serve.py with")
+    parser.add_argument('--url', help="benchmark this running server instead of starting serve.py")
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('--concurrency', type=int, default=32, help="connections sending requests")
+    parser.add_argument('--duration', type=float, default=15, help="seconds measured per config")
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--seed', type=int, default=0, help=f"claims to write for {BENCHMARK_USER} first")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_claims(args.seed)
+
+    print(f"{os.cpu_count()} CPUs, {args.concurrency} connections, {args.duration}s per config, GET {args.path}")
+    print(f"{'config':<10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    if args.url:
+        run_load(args.url, args.path, args.concurrency, args.warmup)
+        _report_line("running", *run_load(args.url, args.path, args.concurrency, args.duration), args.duration)
+    else:
+        for config in args.configs.split(','):
+            workers, threads = (int(value) for value in config.lower().split('x'))
+            latencies, errors = benchmark_config(workers, threads, args.port, args.path,
+                                                 args.concurrency, args.duration, args.warmup)
+            _report_line(config, latencies, errors, args.duration)
@@ -0,0 +1,204 @@
+import argparse
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import ClientError
+from components.s3 import s3_client, bucket_name
+from components.attachment_store import BLOB_PREFIX, BLOB_TABLE, release_attachment, blob_key
+from components.attachment_store import dynamodb_client
+
+# DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# a failed cleanup is retried this many times before it is left to the reconcile run
+MAX_ATTEMPTS = 3
+
+# objects younger than this are never treated as orphans: a claim being submitted has its
+# files uploaded at the same time as its item is written
+ORPHAN_GRACE_PERIOD = timedelta(hours=1)
+
+# cleanups waiting for the collector thread; anything still queued when the process exits is
+# found again by the reconcile run
+cleanup_queue = queue.Queue()
+gc_stats = {'queued': 0, 'prefixes_deleted': 0, 'objects_deleted': 0, 'errors': 0}
+_collector_started = threading.Event()
+_collector_lock = threading.Lock()
+
+
+# function to delete every object under a prefix with paginated listing and batched deletes;
+# objects modified after `older_than` are kept. Returns the number of objects deleted
+def delete_prefix(prefix, older_than=None):
+    deleted = 0
+    batch = []
+
+    def flush():
+        nonlocal deleted
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        errors = response.get('Errors', [])
+        if errors:
+            raise Exception(f"Error deleting {len(errors)} objects under {prefix}: {errors[0].get('Message')}")
+        deleted += len(batch)
+        batch.clear()
+
+    try:
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if older_than is not None and obj['LastModified'] >= older_than:
+                    continue
+                batch.append(obj['Key'])
+                if len(batch) == DELETE_BATCH_SIZE:
+                    flush()
+        if batch:
+            flush()
+
+        # parts of unfinished uploads are stored too, even though they are not listed as objects
+        paginator = s3_client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for upload in page.get('Uploads', []):
+                if older_than is None or upload['Initiated'] < older_than:
+                    s3_client.abort_multipart_upload(Bucket=bucket_name, Key=upload['Key'], UploadId=upload['UploadId'])
+    except ClientError as e:
+        raise Exception(f"Error deleting objects under {prefix}: {e}")
+
+    return deleted
+
+
+# function to run one queued cleanup: give back the shared blobs the claim referenced, then
+# delete the objects stored under the claim's own prefix
+def _collect(user_id, claim_id, attachment_keys):
+    for file_key in attachment_keys:
+        release_attachment(user_id, file_key)
+    deleted = delete_prefix(f"{user_id}/{claim_id}/")
+    gc_stats['prefixes_deleted'] += 1
+    gc_stats['objects_deleted'] += deleted
+    if deleted:
+        print(f"Deleted {deleted} objects of claim {claim_id}.")
+
+
+def _run_collector():
+    while True:
+        user_id, claim_id, attachment_keys, attempt = cleanup_queue.get()
+        try:
+            _collect(user_id, claim_id, attachment_keys)
+        except Exception as e:
+            gc_stats['errors'] += 1
+            print(f"Error collecting attachments of claim {claim_id} (attempt {attempt}): {e}")
+            if attempt < MAX_ATTEMPTS:
+                cleanup_queue.put((user_id, claim_id, attachment_keys, attempt + 1))
+        finally:
+            cleanup_queue.task_done()
+
+
+# function to start the collector thread once per worker process
+def start_attachment_gc():
+    with _collector_lock:
+        if _collector_started.is_set():
+            return
+        _collector_started.set()
+    threading.Thread(target=_run_collector, name='attachment-gc', daemon=True).start()
+
+
+# function to queue the files of a deleted claim for removal, off the request path
+def enqueue_claim_cleanup(user_id, claim_id, attachment_keys=()):
+    start_attachment_gc()
+    gc_stats['queued'] += 1
+    cleanup_queue.put((user_id, claim_id, list(attachment_keys), 1))
+
+
+# function to list the "directories" directly below a prefix
+def _list_subprefixes(prefix):
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+        for common_prefix in page.get('CommonPrefixes', []):
+            yield common_prefix['Prefix']
+
+
+# function to read the claim IDs a user has in the claims table
+def _claim_ids_of_user(user_id, table_name="ClaimsTable"):
+    claim_ids = set()
+    paginator = dynamodb_client.get_paginator('query')
+    pages = paginator.paginate(
+        TableName=table_name,
+        KeyConditionExpression="UserID = :user_id",
+        ExpressionAttributeValues={':user_id': {'S': user_id}},
+        ProjectionExpression="ClaimID"
+    )
+    for page in pages:
+        claim_ids.update(item['ClaimID']['S'] for item in page['Items'])
+    return claim_ids
+
+
+# function to find blob objects of a user that no reference count item points at
+def _orphaned_blob_keys(user_id, cutoff):
+    generations = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{user_id}/{BLOB_PREFIX}/"):
+        for obj in page.get('Contents', []):
+            if obj['LastModified'] >= cutoff:
+                continue
+            parts = obj['Key'].split('/')
+            # staging copies older than the grace period belong to uploads that died half way
+            if len(parts) != 4 or parts[2] == 'staging':
+                yield obj['Key']
+                continue
+
+            digest, generation = parts[2], parts[3]
+            if digest not in generations:
+                item = dynamodb_client.get_item(
+                    TableName=BLOB_TABLE,
+                    Key={'UserID': {'S': user_id}, 'Digest': {'S': digest}},
+                    ConsistentRead=True
+                ).get('Item')
+                generations[digest] = item['Generation']['S'] if item else None
+            if obj['Key'] != blob_key(user_id, digest, generations[digest]):
+                yield obj['Key']
+
+
+# function to find orphans by diffing the S3 key layout against the tables: claim prefixes
+# without a claim item, and blob objects without a reference count item
+def find_orphans(grace_period=ORPHAN_GRACE_PERIOD):
+    cutoff = datetime.now(timezone.utc) - grace_period
+    try:
+        for user_prefix in _list_subprefixes(""):
+            user_id = user_prefix.rstrip('/')
+            claim_ids = _claim_ids_of_user(user_id)
+            for claim_prefix in _list_subprefixes(user_prefix):
+                claim_id = claim_prefix[len(user_prefix):].rstrip('/')
+                if claim_id != BLOB_PREFIX and claim_id not in claim_ids:
+                    yield claim_prefix
+            yield from _orphaned_blob_keys(user_id, cutoff)
+    except ClientError as e:
+        raise Exception(f"Error reconciling attachments: {e}")
+
+
+# function to report orphaned objects and, unless dry_run, delete the ones past the grace period
+def reconcile(dry_run=True, grace_period=ORPHAN_GRACE_PERIOD):
+    cutoff = datetime.now(timezone.utc) - grace_period
+    orphans = 0
+    deleted = 0
+    for orphan in find_orphans(grace_period):
+        orphans += 1
+        print(f"Orphaned: {orphan}")
+        if not dry_run:
+            # blob keys match exactly one object, claim prefixes everything below them
+            deleted += delete_prefix(orphan, older_than=cutoff)
+    print(f"Found {orphans} orphaned prefixes or blobs, deleted {deleted} objects.")
+    return {'orphans': orphans, 'deleted': deleted}
+
+
+# run with: python -m components.attachment_gc --reconcile [--delete]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find (and delete) attachments no claim refers to.")
+    parser.add_argument('--reconcile', action='store_true', help="diff S3 against the claims and blob tables")
+    parser.add_argument('--delete', action='store_true', help="delete the orphans instead of only listing them")
+    parser.add_argument('--grace-hours', type=float, default=ORPHAN_GRACE_PERIOD.total_seconds() / 3600,
+                        help="ignore objects modified more recently than this")
+    args = parser.parse_args()
+
+    if not args.reconcile:
+        parser.error("nothing to do, pass --reconcile")
+    reconcile(dry_run=not args.delete, grace_period=timedelta(hours=args.grace_hours))
@@ -0,0 +1,286 @@
+import base64
+import hashlib
+import re
+import uuid
+from botocore.exceptions import ClientError
+from components.s3 import s3_client, bucket_name
+from components.s3_stream import stream_upload_to_s3
+from components.aws_clients import client_proxy
+
+# shared DynamoDB client for the blob reference counts
+dynamodb_client = client_proxy('dynamodb')
+
+# table holding one item per stored blob: (UserID, Digest) -> RefCount, Size, ContentType
+BLOB_TABLE = "AttachmentBlobsTable"
+
+# blobs are shared between the claims of one user only, so knowing a digest never gives
+# access to somebody else's file. Every incarnation of a blob gets its own generation in the
+# key, so a blob being deleted after its last release never clobbers one stored again
+BLOB_PREFIX = "blobs"
+_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+# function to build the S3 key of a user's blob
+def blob_key(user_id, digest, generation):
+    return f"{user_id}/{BLOB_PREFIX}/{digest}/{generation}"
+
+# function to check whether an attachment key points at a shared blob
+def is_blob_key(user_id, file_key):
+    return bool(file_key) and file_key.startswith(f"{user_id}/{BLOB_PREFIX}/")
+
+# new blobs land on a staging key until their digest is known and they are moved into place;
+# copies left behind by uploads that never finished are deleted by the attachment_gc reconcile run
+def _new_staging_key(user_id):
+    return f"{user_id}/{BLOB_PREFIX}/staging/{uuid.uuid4().hex}"
+
+# function to check whether a key is one of the user's staged uploads
+def is_staging_key(user_id, file_key):
+    return bool(file_key) and file_key.startswith(f"{user_id}/{BLOB_PREFIX}/staging/") and file_key.count('/') == 3
+
+# function to check that a client supplied digest is a lowercase hex SHA-256
+def is_valid_digest(digest):
+    return bool(digest) and bool(_DIGEST_PATTERN.match(digest))
+
+
+# function to create the blob reference count table if it doesn't exist
+def create_blob_table(table_name=BLOB_TABLE):
+    try:
+        try:
+            dynamodb_client.describe_table(TableName=table_name)
+            print(f"Table '{table_name}' already exists.")
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+
+        dynamodb_client.create_table(
+            TableName=table_name,
+            AttributeDefinitions=[
+                {'AttributeName': 'UserID', 'AttributeType': 'S'},
+                {'AttributeName': 'Digest', 'AttributeType': 'S'}
+            ],
+            KeySchema=[
+                {'AttributeName': 'UserID', 'KeyType': 'HASH'},
+                {'AttributeName': 'Digest', 'KeyType': 'RANGE'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        print(f"Table '{table_name}' created successfully.")
+    except ClientError as e:
+        print(f"Error creating blob table: {e}")
+
+
+def _blob_item_key(user_id, digest):
+    return {'UserID': {'S': user_id}, 'Digest': {'S': digest}}
+
+def _blob_exists_in_s3(file_key):
+    try:
+        s3_client.head_object(Bucket=bucket_name, Key=file_key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise Exception(f"Error reading blob metadata: {e}")
+
+
+# function to take one reference on a blob, creating its item (and generation) on first use;
+# with only_existing it fails instead of reviving a blob whose last reference is gone
+def _acquire_ref(user_id, digest, size, content_type, only_existing=False):
+    update_args = {}
+    if only_existing:
+        update_args['ConditionExpression'] = "RefCount > :zero"
+    try:
+        response = dynamodb_client.update_item(
+            TableName=BLOB_TABLE,
+            Key=_blob_item_key(user_id, digest),
+            UpdateExpression="ADD RefCount :one SET #size = if_not_exists(#size, :size), "
+                             "ContentType = if_not_exists(ContentType, :content_type), "
+                             "Generation = if_not_exists(Generation, :generation)",
+            ExpressionAttributeNames={'#size': 'Size'},
+            ExpressionAttributeValues={
+                ':one': {'N': '1'},
+                ':size': {'N': str(size)},
+                ':content_type': {'S': content_type},
+                ':generation': {'S': uuid.uuid4().hex},
+                **({':zero': {'N': '0'}} if only_existing else {})
+            },
+            ReturnValues='ALL_NEW',
+            **update_args
+        )
+    except ClientError as e:
+        if only_existing and e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise Exception(f"Error referencing blob: {e}")
+
+    item = response['Attributes']
+    return {
+        'key': blob_key(user_id, digest, item['Generation']['S']),
+        'size': int(item['Size']['N']),
+        'content_type': item['ContentType']['S'],
+        'references': int(item['RefCount']['N'])
+    }
+
+
+# function to reuse a blob the user already stored, given the digest the client computed;
+# returns the blob with a reference taken, or None if the file has to be uploaded
+def reference_existing_blob(user_id, digest):
+    blob = _acquire_ref(user_id, digest, 0, 'application/octet-stream', only_existing=True)
+    if blob is None:
+        return None
+
+    # the first upload of this digest may still be copying its object into place
+    if not _blob_exists_in_s3(blob['key']):
+        release_attachment(user_id, blob['key'])
+        return None
+    return blob
+
+
+# function to presign a browser upload of a new blob straight to S3. The policy pins a fresh
+# staging key, the content type, the size and the SHA-256 the client computed, which S3
+# checks against the body it receives
+def presign_blob_upload(user_id, digest, content_type, max_size, expiration=600):
+    staging_key = _new_staging_key(user_id)
+    fields = {
+        'Content-Type': content_type,
+        'x-amz-checksum-sha256': base64.b64encode(bytes.fromhex(digest)).decode()
+    }
+    try:
+        response = s3_client.generate_presigned_post(
+            Bucket=bucket_name,
+            Key=staging_key,
+            Fields=fields,
+            Conditions=[{name: value} for name, value in fields.items()] + [['content-length-range', 1, max_size]],
+            ExpiresIn=expiration
+        )
+    except ClientError as e:
+        raise Exception(f"Error presigning blob upload: {e}")
+    return {'url': response['url'], 'fields': response['fields'], 'key': staging_key}
+
+
+# function to read the size, content type and SHA-256 of a staged upload, or None if it is
+# missing; the digest is the checksum S3 verified on upload, or computed here if it kept none
+def _describe_staged_upload(staging_key):
+    try:
+        response = s3_client.head_object(Bucket=bucket_name, Key=staging_key, ChecksumMode='ENABLED')
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise Exception(f"Error reading staged upload: {e}")
+
+    checksum = response.get('ChecksumSHA256')
+    if checksum and '-' not in checksum:  # a multipart checksum is not the digest of the file
+        digest = base64.b64decode(checksum).hex()
+    else:
+        hasher = hashlib.sha256()
+        try:
+            body = s3_client.get_object(Bucket=bucket_name, Key=staging_key)['Body']
+            for chunk in body.iter_chunks(1024 * 1024):
+                hasher.update(chunk)
+        except ClientError as e:
+            raise Exception(f"Error reading staged upload: {e}")
+        digest = hasher.hexdigest()
+
+    return {
+        'size': response['ContentLength'],
+        'sha256': digest,
+        'content_type': response.get('ContentType') or 'application/octet-stream'
+    }
+
+
+# function to move a staged upload into the user's blob store; a file the user already stored
+# is dropped and the existing blob is referenced. The staged object is always deleted
+def _store_staged_blob(user_id, staging_key, upload, content_type):
+    blob = None
+    try:
+        blob = _acquire_ref(user_id, upload['sha256'], upload['size'], content_type)
+        deduplicated = blob['references'] > 1 and _blob_exists_in_s3(blob['key'])
+        if not deduplicated:
+            s3_client.copy_object(
+                Bucket=bucket_name,
+                Key=blob['key'],
+                CopySource={'Bucket': bucket_name, 'Key': staging_key},
+                ContentType=content_type,
+                MetadataDirective='REPLACE'
+            )
+    except Exception as e:
+        # give back the reference taken for a blob that never made it into place
+        if blob is not None:
+            release_attachment(user_id, blob['key'])
+        if isinstance(e, ClientError):
+            raise Exception(f"Error storing blob: {e}")
+        raise
+    finally:
+        try:
+            s3_client.delete_object(Bucket=bucket_name, Key=staging_key)
+        except ClientError as e:
+            print(f"Error deleting staged upload {staging_key}: {e}")
+
+    return {
+        'key': blob['key'],
+        'size': upload['size'],
+        'sha256': upload['sha256'],
+        'content_type': blob['content_type'],
+        'deduplicated': deduplicated
+    }
+
+
+# function to receive an upload into the user's blob store, hashing it on the way in
+def store_blob_from_stream(user_id, stream, content_type, max_size):
+    # the digest is only known once the body has been read
+    staging_key = _new_staging_key(user_id)
+    upload = stream_upload_to_s3(stream, staging_key, content_type, max_size=max_size)
+    return _store_staged_blob(user_id, staging_key, upload, content_type)
+
+
+# function to move a file the browser uploaded with presign_blob_upload into the user's blob
+# store; returns None if there is no such upload
+def finalize_staged_blob(user_id, staging_key):
+    upload = _describe_staged_upload(staging_key)
+    if upload is None:
+        return None
+    return _store_staged_blob(user_id, staging_key, upload, upload['content_type'])
+
+
+# function to drop one reference on a blob, deleting the blob once nothing uses it
+def release_blob(user_id, digest, generation):
+    generation_value = {':generation': {'S': generation}}
+    try:
+        response = dynamodb_client.update_item(
+            TableName=BLOB_TABLE,
+            Key=_blob_item_key(user_id, digest),
+            UpdateExpression="ADD RefCount :minus_one",
+            ConditionExpression="Generation = :generation",
+            ExpressionAttributeValues={':minus_one': {'N': '-1'}, **generation_value},
+            ReturnValues='UPDATED_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return
+        raise Exception(f"Error releasing blob: {e}")
+
+    if int(response['Attributes']['RefCount']['N']) > 0:
+        return
+
+    try:
+        # only delete if nobody took a new reference in the meantime; once the item is gone the
+        # next upload of this digest starts a new generation, so the object below is ours alone
+        dynamodb_client.delete_item(
+            TableName=BLOB_TABLE,
+            Key=_blob_item_key(user_id, digest),
+            ConditionExpression="RefCount <= :zero AND Generation = :generation",
+            ExpressionAttributeValues={':zero': {'N': '0'}, **generation_value}
+        )
+        s3_client.delete_object(Bucket=bucket_name, Key=blob_key(user_id, digest, generation))
+        print(f"Blob {digest} of user {user_id} deleted.")
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise Exception(f"Error deleting blob: {e}")
+
+
+# function to release the blob behind an attachment key; keys outside the blob store are ignored
+def release_attachment(user_id, file_key):
+    if not is_blob_key(user_id, file_key):
+        return
+    parts = file_key.split('/')
+    if len(parts) == 4:
+        release_blob(user_id, parts[2], parts[3])
@@ -0,0 +1,98 @@
+import os
+import threading
+
+AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+
+# one connection pool per client and one client per service, so the pool has to cover every
+# thread that may call the service at once: the request threads plus the claim submission,
+# upload and streaming pools (8 + 8 + 16 threads, each S3 transfer using up to 4 connections)
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 64))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', 3))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', 30))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+
+_config = None
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+# settings shared by every client: timeouts that fail fast instead of hanging a request thread,
+# keepalive so idle pooled connections are not silently dropped, and adaptive retries that
+# back off client side when a service starts throttling. boto3 and botocore take about a third
+# of the app's import time, so they are only imported when the first client is created
+def get_client_config():
+    global _config
+    if _config is None:
+        from botocore.config import Config
+        _config = Config(
+            region_name=AWS_REGION,
+            max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+            connect_timeout=AWS_CONNECT_TIMEOUT,
+            read_timeout=AWS_READ_TIMEOUT,
+            tcp_keepalive=True,
+            retries={'mode': 'adaptive', 'total_max_attempts': AWS_MAX_ATTEMPTS}
+        )
+    return _config
+
+
+# function to add the settings of one service to the shared ones: S3 URLs are presigned with
+# SigV4, which also signs headers such as the Content-Length of an upload part
+def _service_config(service_name):
+    config = get_client_config()
+    if service_name == 's3':
+        from botocore.config import Config
+        config = config.merge(Config(signature_version='s3v4'))
+    return config
+
+
+# function to get the shared client of a service, creating it on first use; boto3 sessions are
+# not thread safe, so clients are created under a lock (using them afterwards is thread safe)
+def get_client(service_name):
+    global _session
+    client = _clients.get(service_name)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(service_name)
+        if client is None:
+            if _session is None:
+                import boto3.session
+                _session = boto3.session.Session()
+            client = _session.client(service_name, config=_service_config(service_name))
+            _clients[service_name] = client
+        return client
+
+
+class _ClientProxy:
+    """Stands in for a module level client and creates the real one on first use."""
+
+    __slots__ = ('_service_name',)
+
+    def __init__(self, service_name):
+        self._service_name = service_name
+
+    def __getattr__(self, name):
+        return getattr(get_client(self._service_name), name)
+
+    def __repr__(self):
+        return f"<client proxy for {self._service_name}>"
+
+
+# function to give a module its client without creating it at import time
+def client_proxy(service_name):
+    return _ClientProxy(service_name)
+
+
+# services the app calls while serving requests
+SERVING_SERVICES = ('dynamodb', 's3', 'cognito-idp', 'sns')
+
+
+# function to create the serving clients up front in a pre-forking server's master process:
+# loading boto3 and the service models takes a few hundred ms and MBs per process, and workers
+# forked afterwards share them copy-on-write. Connections are only opened on a client's first
+# call, so this must run before the master makes any; each worker then fills its own pools
+def preload_clients(service_names=SERVING_SERVICES):
+    for service_name in service_names:
+        get_client(service_name)
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+# Crockford base32, the alphabet used by ULIDs (sorts the same as the numbers it encodes)
+ENCODING = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+# a claim ID is a 48 bit millisecond timestamp followed by 80 bits of randomness
+TIMESTAMP_BITS = 48
+RANDOM_BITS = 80
+MAX_RANDOM = (1 << RANDOM_BITS) - 1
+ID_LENGTH = 26
+
+# state shared by every thread of the process so IDs stay strictly increasing
+_lock = threading.Lock()
+_last_timestamp = -1
+_last_random = 0
+
+
+def _encode(value):
+    characters = []
+    for _ in range(ID_LENGTH):
+        value, remainder = divmod(value, 32)
+        characters.append(ENCODING[remainder])
+    return "".join(reversed(characters))
+
+
+def _next_values(count):
+    """
+    Returns `count` (timestamp, random) pairs that are strictly increasing.
+    Within one millisecond (or if the clock goes backwards) the random part is incremented
+    instead of redrawn, as in monotonic ULIDs.
+    """
+    global _last_timestamp, _last_random
+
+    values = []
+    with _lock:
+        for _ in range(count):
+            timestamp = time.time_ns() // 1_000_000
+            if timestamp > _last_timestamp:
+                _last_timestamp = timestamp
+                _last_random = int.from_bytes(os.urandom(10), 'big')
+            elif _last_random < MAX_RANDOM:
+                _last_random += 1
+            else:
+                # random part exhausted within this millisecond, borrow the next one
+                _last_timestamp += 1
+                _last_random = int.from_bytes(os.urandom(10), 'big')
+            values.append((_last_timestamp, _last_random))
+    return values
+
+
+# function to generate one time-ordered, unique claim ID
+def generate_claim_id():
+    return generate_claim_ids(1)[0]
+
+
+# function to generate a batch of time-ordered, unique claim IDs with a single lock acquisition
+def generate_claim_ids(count):
+    return [_encode((timestamp << RANDOM_BITS) | random) for timestamp, random in _next_values(count)]
+
+
+# function to get the lowest and highest claim IDs that can be generated between two datetimes,
+# so a submission-time range becomes a `ClaimID BETWEEN :start AND :end` key condition
+def claim_id_bounds(start, end):
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000)
+    return _encode(start_ms << RANDOM_BITS), _encode((end_ms << RANDOM_BITS) | MAX_RANDOM)
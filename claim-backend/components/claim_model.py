@@ -0,0 +1,156 @@
+import os
+from urllib.parse import unquote, urlparse
+
+# version of the compact claim JSON returned by the claim routes
+# (version 1 was the raw DynamoDB AttributeValue format)
+CLAIM_JSON_VERSION = 2
+
+
+# codecs between python values and DynamoDB AttributeValues
+def _encode_string(value):
+    return {'S': value}
+
+def _decode_string(attribute):
+    return attribute.get('S')
+
+# attachment metadata: (dict key, encoder, decoder) for each attribute of an attachment map
+_ATTACHMENT_FIELDS = (
+    ('key', _encode_string, _decode_string),
+    ('name', _encode_string, _decode_string),
+    ('size', lambda value: {'N': str(value)}, lambda attribute: int(attribute['N'])),
+    ('content_type', _encode_string, _decode_string),
+    ('checksum', _encode_string, _decode_string),
+)
+
+def encode_attachment(attachment):
+    return {'M': {
+        name: encode(attachment[name])
+        for name, encode, _ in _ATTACHMENT_FIELDS
+        if attachment.get(name) is not None
+    }}
+
+def _decode_attachment(attribute):
+    values = attribute.get('M', {})
+    return {name: decode(values[name]) if name in values else None for name, _, decode in _ATTACHMENT_FIELDS}
+
+def _encode_attachments(attachments):
+    return {'L': [encode_attachment(attachment) for attachment in attachments]}
+
+def _decode_attachments(attribute):
+    return [_decode_attachment(value) for value in attribute.get('L', [])]
+
+# an item stays well below the 400KB DynamoDB limit with this many attachment entries
+MAX_ATTACHMENTS_PER_CLAIM = 20
+
+# function to give a file a name that is not taken yet, e.g. a second "scan.pdf" -> scan-2.pdf
+def unique_filename(filename, taken):
+    stem, extension = os.path.splitext(filename)
+    counter = 2
+    while filename in taken:
+        filename = f"{stem}-{counter}{extension}"
+        counter += 1
+    return filename
+
+
+# table of claim fields: (slot name, DynamoDB attribute, compact JSON key, encoder, decoder)
+_FIELDS = (
+    ('user_id', 'UserID', None, _encode_string, _decode_string),
+    ('claim_id', 'ClaimID', 'id', _encode_string, _decode_string),
+    ('title', 'ClaimTitle', 'title', _encode_string, _decode_string),
+    ('claim_type', 'ClaimType', 'type', _encode_string, _decode_string),
+    ('details', 'ClaimDetails', 'details', _encode_string, _decode_string),
+    # presigned URLs are created at read time, FileURL is only kept to read claims stored before FileKey
+    ('file_url', 'FileURL', None, _encode_string, _decode_string),
+    ('file_key', 'FileKey', None, _encode_string, _decode_string),
+    # key, name, size, content type and checksum of every file, so listing needs no HeadObject
+    ('attachments', 'Attachments', None, _encode_attachments, _decode_attachments),
+    ('submission_date', 'submission_date', 'submitted', _encode_string, _decode_string),
+    ('due_date', 'due_date', 'due', _encode_string, _decode_string),
+    # time of the last write in ms since the epoch, indexed per user for delta sync
+    ('updated_at', 'UpdatedAt', 'updated', lambda value: {'N': str(value)}, lambda attribute: int(attribute['N'])),
+)
+
+# lookup tables built once at import so marshal and unmarshal are plain loops over tuples
+_MARSHAL_FIELDS = tuple((slot, attribute, encode) for slot, attribute, _, encode, _ in _FIELDS)
+_UNMARSHAL_FIELDS = tuple((slot, attribute, decode) for slot, attribute, _, _, decode in _FIELDS)
+_JSON_FIELDS = tuple((slot, json_key) for slot, _, json_key, _, _ in _FIELDS if json_key)
+_ENCODERS = {slot: (attribute, encode) for slot, attribute, _, encode, _ in _FIELDS}
+
+
+class Claim:
+    """A claim item, stored in DynamoDB and returned to clients as compact JSON."""
+
+    __slots__ = tuple(slot for slot, *_ in _FIELDS)
+
+    def __init__(self, user_id, claim_id, title=None, claim_type=None, details=None,
+                 file_url=None, submission_date=None, due_date=None, file_key=None, attachments=None,
+                 updated_at=None):
+        self.user_id = user_id
+        self.claim_id = claim_id
+        self.title = title
+        self.claim_type = claim_type
+        self.details = details
+        self.file_url = file_url
+        self.submission_date = submission_date
+        self.due_date = due_date
+        self.file_key = file_key
+        self.attachments = attachments
+        self.updated_at = updated_at
+
+    def __repr__(self):
+        return f"Claim(user_id={self.user_id!r}, claim_id={self.claim_id!r})"
+
+    def attachment_list(self):
+        attachments = list(self.attachments or ())
+
+        # claims stored before Attachments have a single FileKey, or only a (long expired)
+        # presigned URL whose path is the object key
+        legacy_key = self.file_key
+        if not legacy_key and self.file_url:
+            legacy_key = unquote(urlparse(self.file_url).path.lstrip('/')) or None
+        if legacy_key and all(attachment['key'] != legacy_key for attachment in attachments):
+            attachments.insert(0, {'key': legacy_key, 'name': legacy_key.rsplit('/', 1)[-1], 'size': None,
+                                   'content_type': None, 'checksum': None})
+        return attachments
+
+    def to_json(self):
+        # empty fields are left out to keep the payload small
+        result = {}
+        for slot, json_key in _JSON_FIELDS:
+            value = getattr(self, slot)
+            if value:
+                result[json_key] = value
+        return result
+
+
+# function to turn a Claim into a DynamoDB item, leaving out unset attributes
+def marshal(claim):
+    item = {}
+    for slot, attribute, encode in _MARSHAL_FIELDS:
+        value = getattr(claim, slot)
+        if value is not None and value != '' and value != []:
+            item[attribute] = encode(value)
+    return item
+
+# function to turn a DynamoDB item (full or projected) into a Claim
+def unmarshal(item):
+    claim = Claim.__new__(Claim)
+    for slot, attribute, decode in _UNMARSHAL_FIELDS:
+        value = item.get(attribute)
+        setattr(claim, slot, decode(value) if value is not None else None)
+    return claim
+
+# function to build the update expression parts for a subset of fields, e.g.
+# marshal_updates(title="x") -> ("SET ClaimTitle = :title", {':title': {'S': 'x'}})
+def marshal_updates(**values):
+    assignments = []
+    expression_values = {}
+    for slot, value in values.items():
+        attribute, encode = _ENCODERS[slot]
+        assignments.append(f"{attribute} = :{slot}")
+        expression_values[f":{slot}"] = encode(value)
+    return "SET " + ", ".join(assignments), expression_values
+
+# function to build the primary key of a claim item
+def claim_key(user_id, claim_id):
+    return {'UserID': {'S': user_id}, 'ClaimID': {'S': claim_id}}
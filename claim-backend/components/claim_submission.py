@@ -0,0 +1,85 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from werkzeug.utils import secure_filename
+from components.dynamoDB import add_claim_to_dynamoDB, delete_claim_from_dynamoDB
+from components.s3 import upload_file_to_s3, delete_file_from_s3
+from components.claim_model import unique_filename
+
+# bounded pools shared by all requests of the worker, so a burst of submissions queues up
+# instead of opening an unbounded number of connections to S3 and DynamoDB
+submission_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='claim-submit')
+upload_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='claim-upload')
+
+
+# function to give every file of a claim its own secure name, e.g. two "scan.pdf" -> scan.pdf, scan-2.pdf
+def _unique_filenames(files):
+    seen = set()
+    filenames = []
+    for file in files:
+        filename = unique_filename(secure_filename(file.filename) or 'attachment', seen)
+        seen.add(filename)
+        filenames.append(filename)
+    return filenames
+
+# function to read the size and SHA-256 of an uploaded file; it is already buffered by the
+# request parser, so this is a local pass that lets the claim item be written with the metadata
+def _describe_file(file, file_key, filename):
+    hasher = hashlib.sha256()
+    size = 0
+    stream = file.stream
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        hasher.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return {
+        'key': file_key,
+        'name': filename,
+        'size': size,
+        'content_type': file.mimetype or 'application/octet-stream',
+        'checksum': hasher.hexdigest()
+    }
+
+
+# function to save a claim and upload its attachments at the same time; if one side fails the
+# other is undone so no orphaned object or claim without its files is left behind
+def submit_claim_pipeline(user_id, claim_id, claim_title, claim_type, claim_details, files=()):
+    if not files:
+        add_claim_to_dynamoDB(user_id, claim_id, claim_title, claim_type, claim_details)
+        return []
+
+    # the claim only stores object keys and metadata, download URLs are signed when claims are read
+    filenames = _unique_filenames(files)
+    attachments = [
+        _describe_file(file, f"{user_id}/{claim_id}/{filename}", filename)
+        for file, filename in zip(files, filenames)
+    ]
+
+    uploads = [
+        upload_pool.submit(upload_file_to_s3, user_id, claim_id, file, filename)
+        for file, filename in zip(files, filenames)
+    ]
+    write = submission_pool.submit(add_claim_to_dynamoDB, user_id, claim_id, claim_title,
+                                   claim_type, claim_details, attachments)
+    wait(uploads + [write])
+
+    upload_error = next((upload.exception() for upload in uploads if upload.exception()), None)
+    write_error = write.exception()
+
+    if upload_error or write_error:
+        # a failed write (a timeout, say) may still have stored the item, and deleting is idempotent
+        print(f"Submitting claim {claim_id} failed, rolling back the claim item and its uploaded files.")
+        _compensate(delete_claim_from_dynamoDB, user_id, claim_id)
+        for upload, filename in zip(uploads, filenames):
+            if not upload.exception():
+                _compensate(delete_file_from_s3, user_id, claim_id, filename)
+        raise upload_error or write_error
+
+    return attachments
+
+
+# function to run a compensating action without hiding the original error if it fails too
+def _compensate(action, *args):
+    try:
+        action(*args)
+    except Exception as e:
+        print(f"Error compensating failed claim submission: {e}")
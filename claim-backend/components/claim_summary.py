@@ -0,0 +1,144 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+# this module is also packaged into the email Lambda (see lambda_fun.py), so it only depends on boto3
+
+# the DynamoDB client is only created when the Lambda applies stream records; the app imports
+# this module for its constants and summarize, and uses the shared client of aws_clients.py
+_dynamodb_client = None
+
+def _get_dynamodb_client():
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        import boto3  # imported here so the app does not pay for boto3 when importing the constants
+        _dynamodb_client = boto3.client('dynamodb', region_name='us-east-1')
+    return _dynamodb_client
+
+# table holding one summary item per user, keyed by UserID
+SUMMARY_TABLE = "ClaimSummaryTable"
+
+# due-date windows (in days) reported by the summary
+DUE_BUCKETS = (7, 30, 90)
+
+# attribute names used on the summary item
+TOTAL_ATTRIBUTE = "TotalClaims"
+TYPE_PREFIX = "Type_"
+DUE_PREFIX = "Due_"
+
+# attribute holding a token that changes whenever the user's claims or counters change, which
+# the app turns into ETags; it is random rather than a counter, so a rebuilt item can never
+# bring back a version (and ETag) a client already holds for different data
+VERSION_ATTRIBUTE = "ClaimsVersion"
+
+# version of users whose item has none yet; every write replaces it with a random one
+INITIAL_CLAIMS_VERSION = "0"
+
+
+def new_claims_version():
+    return uuid.uuid4().hex
+
+
+# function to work out how one stream record changes the counters of its user
+def summary_delta(record):
+    """
+    Returns (user_id, {attribute_name: delta}) for a DynamoDB stream record.
+    Modified and removed claims can only be undone with the old image, so those records are
+    skipped unless the stream carries both images (NEW_AND_OLD_IMAGES).
+    """
+    event_name = record['eventName']
+    images = record['dynamodb']
+    if event_name in ('MODIFY', 'REMOVE') and 'OldImage' not in images \
+            and images.get('StreamViewType') != 'NEW_AND_OLD_IMAGES':
+        return None, {}
+    old_image = images.get('OldImage') if event_name in ('MODIFY', 'REMOVE') else None
+    new_image = images.get('NewImage') if event_name in ('INSERT', 'MODIFY') else None
+
+    image = new_image or old_image
+    if not image:
+        return None, {}
+
+    delta = defaultdict(int)
+    for sign, item in ((-1, old_image), (1, new_image)):
+        if not item:
+            continue
+        delta[TOTAL_ATTRIBUTE] += sign
+        claim_type = item.get('ClaimType', {}).get('S')
+        if claim_type:
+            delta[TYPE_PREFIX + claim_type] += sign
+        due_date = item.get('due_date', {}).get('S')
+        if due_date:
+            # due dates are counted per day, the relative 7/30/90 day windows are summed on read
+            # because counters for "next N days" would go stale as the calendar moves on
+            delta[DUE_PREFIX + due_date] += sign
+
+    return image['UserID']['S'], {name: value for name, value in delta.items() if value}
+
+
+# function to atomically apply counter changes to a user's summary item with an ADD expression
+def apply_summary_delta(user_id, delta):
+    if not delta:
+        return
+
+    names = {'#version': VERSION_ATTRIBUTE}
+    values = {':version': {'S': new_claims_version()}}
+    clauses = []
+    for position, (attribute, value) in enumerate(sorted(delta.items())):
+        names[f"#a{position}"] = attribute
+        values[f":v{position}"] = {'N': str(value)}
+        clauses.append(f"#a{position} :v{position}")
+
+    _get_dynamodb_client().update_item(
+        TableName=SUMMARY_TABLE,
+        Key={'UserID': {'S': user_id}},
+        # the counters changed, so responses built from them get a new ETag
+        UpdateExpression="ADD " + ", ".join(clauses) + " SET #version = :version",
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+# function for the stream consumer: fold a batch of records into one update per user
+def apply_stream_records(records):
+    # a failed update makes Lambda retry the whole batch, so counters of users updated earlier in
+    # that batch can drift; dynamoDB.rebuild_claim_summary recomputes an item from the claims table
+    deltas = defaultdict(lambda: defaultdict(int))
+    for record in records:
+        user_id, delta = summary_delta(record)
+        for attribute, value in delta.items():
+            deltas[user_id][attribute] += value
+
+    for user_id, delta in deltas.items():
+        apply_summary_delta(user_id, {name: value for name, value in delta.items() if value})
+
+
+# function to turn a raw summary item into the counters shown on the dashboard
+def summarize(item, today=None):
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+
+    total_claims = 0
+    claims_by_type = {}
+    due_counts = {}
+    for attribute, value in item.items():
+        if attribute == TOTAL_ATTRIBUTE:
+            total_claims = int(value['N'])
+        elif attribute.startswith(TYPE_PREFIX):
+            count = int(value['N'])
+            if count:
+                claims_by_type[attribute[len(TYPE_PREFIX):]] = count
+        elif attribute.startswith(DUE_PREFIX):
+            due_counts[attribute[len(DUE_PREFIX):]] = int(value['N'])
+
+    # due dates are YYYY-MM-DD strings so the windows are plain string comparisons
+    start_date = today.isoformat()
+    summary = {
+        'total_claims': total_claims,
+        'claims_by_type': claims_by_type
+    }
+    for days in DUE_BUCKETS:
+        end_date = (today + timedelta(days=days)).isoformat()
+        summary[f'due_in_next_{days}_days'] = sum(
+            count for due_date, count in due_counts.items() if start_date <= due_date <= end_date
+        )
+    return summary
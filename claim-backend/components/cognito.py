@@ -1,21 +1,28 @@
-import boto3
+from components.aws_clients import client_proxy
 from botocore.exceptions import ClientError
-import jwt  
 
 
 # initialize the Cognito client for interacting with AWS Cognito using boto3 sdk
-cognito_client = boto3.client('cognito-idp', region_name='us-east-1')
+cognito_client = client_proxy('cognito-idp')
+
+# function to look up the ID of an existing user pool, or None if there is no such pool
+def find_user_pool(pool_name):
+    # page through all user pools, 60 is the most a single call returns
+    paginator = cognito_client.get_paginator('list_user_pools')
+    for page in paginator.paginate(MaxResults=60):
+        for pool in page['UserPools']:
+            if pool['Name'] == pool_name:
+                return pool['Id']
+    return None
 
 # function to create a user pool 
 def create_user_pool(pool_name):
     try:
-        # list all user pools
-        response = cognito_client.list_user_pools(MaxResults=60)
-        for pool in response['UserPools']:
-            if pool['Name'] == pool_name:
-                print(f"User pool '{pool_name}' already exists.")
-                return pool['Id']  
-        
+        pool_id = find_user_pool(pool_name)
+        if pool_id:
+            print(f"User pool '{pool_name}' already exists.")
+            return pool_id
+
         # if pool doesn't exist, use create user pool function using parameters
         #PoolName, usernameattributes,autoverifiedattributes and mfaconfiguration.
         response = cognito_client.create_user_pool(
@@ -32,6 +39,16 @@ def create_user_pool(pool_name):
         print(f"Error creating user pool: {e}")
         return None
 
+# function to look up the ID of an existing app client of a pool, or None if there is no such client
+def find_app_client(user_pool_id, client_name):
+    # page through the existing app clients of the pool
+    paginator = cognito_client.get_paginator('list_user_pool_clients')
+    for page in paginator.paginate(UserPoolId=user_pool_id, MaxResults=60):
+        for client in page['UserPoolClients']:
+            if client['ClientName'] == client_name:
+                return client['ClientId']
+    return None
+
 # Create an app client function for the user pool if it doesn't exist using parameters
 #userpoolid, clientname, generatesecret, explicitauthflows, supportedidentify providers
 def create_app_client(user_pool_id, client_name):
@@ -40,13 +57,12 @@ def create_app_client(user_pool_id, client_name):
             print("Error: Invalid User Pool ID. Cannot create app client.")
             return None
 
-        # list existing app clients for the pool to check if it exists
-        response = cognito_client.list_user_pool_clients(UserPoolId=user_pool_id)
-        for client in response['UserPoolClients']:
-            if client['ClientName'] == client_name:
-                print(f"App client '{client_name}' already exists.")
-                return client['ClientId']  
-        
+        # check if the app client exists
+        client_id = find_app_client(user_pool_id, client_name)
+        if client_id:
+            print(f"App client '{client_name}' already exists.")
+            return client_id
+
         # If app client doesn't exist, create one
         response = cognito_client.create_user_pool_client(
             UserPoolId=user_pool_id,
@@ -61,9 +77,9 @@ def create_app_client(user_pool_id, client_name):
         print(f"Error creating app client: {e}")
         return None
 
-# import function to create SNS topic and set up SNS client for notifications through AWS SNS
-from components.sns import create_sns_topic 
-sns_client = boto3.client('sns', region_name='us-east-1')
+# set up SNS client for notifications through AWS SNS, the topic ARN is resolved once per process
+from components.resources import get_resource
+sns_client = client_proxy('sns')
 import json
 # function for registering a user (signup with email and password) using parameters
 #clientid, username, password and user attributes
@@ -97,9 +113,13 @@ def register_user(client_id, user_pool_id, email, password):
 
         # subscribe the user to an SNS topic
         user_sub = response['UserSub']
-        topic_name = "ClaimSubmissionTopic"
-        sns_topic_arn = create_sns_topic(topic_name)
-        
+        try:
+            sns_topic_arn = get_resource('topic_arn')
+        except LookupError as e:
+            # the user is already signed up, so registration succeeds without the subscription
+            print(f"Skipping SNS subscription for {email}: {e}")
+            sns_topic_arn = None
+
         if sns_topic_arn:
             # subscribe to SNS using email
             sns_client.subscribe(
@@ -143,7 +163,8 @@ def login_user(client_id, email, password):
         id_token = response['AuthenticationResult']['IdToken']
         access_token = response['AuthenticationResult']['AccessToken']
         
-        # decode the ID Token to get user informate
+        # decode the ID Token to get user informate (jwt is only imported once somebody logs in)
+        import jwt
         decoded_token = jwt.decode(id_token, options={"verify_signature": False})  
         user_id = decoded_token['sub']  # unique id in cognito
         
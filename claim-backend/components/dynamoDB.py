@@ -1,20 +1,80 @@
-import boto3
+import base64
+import json
+import time
 from botocore.exceptions import ClientError
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from claims_lib  import calculate_due_date
 from claims_lib import get_submission_date
+from components.claim_model import Claim, marshal, unmarshal, marshal_updates, claim_key
+from components.claim_model import encode_attachment, MAX_ATTACHMENTS_PER_CLAIM
+from components.claim_ids import claim_id_bounds
+from components.cache import TTLCache, MISSING
+from components.single_flight import single_flight
+from components.aws_clients import client_proxy
+from components.claim_summary import SUMMARY_TABLE, TOTAL_ATTRIBUTE, TYPE_PREFIX, DUE_PREFIX, summarize
+from components.claim_summary import VERSION_ATTRIBUTE, INITIAL_CLAIMS_VERSION, new_claims_version
 
 
 # Initialize the DynamoDB client
-dynamodb_client = boto3.client('dynamodb', region_name='us-east-1') 
+dynamodb_client = client_proxy('dynamodb')
+
+# times an attachment is appended to a claim before giving up on concurrent uploads to it
+ATTACH_ATTEMPTS = 5
+
+# local secondary index on UserID + due_date used for "due in the next N days" queries
+DUE_DATE_INDEX = "DueDateIndex"
+
+# local secondary index on UserID + UpdatedAt used for delta sync; local so it can be read consistently
+UPDATED_AT_INDEX = "UpdatedAtIndex"
+
+# table remembering deleted claims for delta sync, keyed by UserID + "<deleted at ms>#<claim id>"
+TOMBSTONE_TABLE = "ClaimTombstonesTable"
+
+# function to tell whether a query failed because the table predates one of the local secondary
+# indexes above (they can only be added when a table is created)
+def is_missing_index_error(error, index_name):
+    return (error.response['Error']['Code'] in ('ValidationException', 'ResourceNotFoundException')
+            and index_name in error.response['Error'].get('Message', ''))
+
+# deleted claims are remembered this long; a sync token older than that has to start over
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# claims written shortly before a sync may not be visible to it yet (writes in flight, clocks of
+# different workers), so a sync token starts this far before the time it was handed out; those
+# claims are sent again on the next sync, which clients apply by claim ID
+SYNC_SAFETY_MARGIN_MS = 30 * 1000
+
+# read-through cache of claim pages per worker, grouped by user so writes can invalidate them;
+# pages read with the user's claims version are keyed by it, so other workers' writes are seen
+# right away, otherwise only once an entry expires
+claims_cache = TTLCache(max_entries=2048, ttl=60, negative_ttl=15)
+
+# function to describe a table, or None if it does not exist
+def find_table(table_name):
+    try:
+        return dynamodb_client.describe_table(TableName=table_name)['Table']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return None
+        raise
 
 # function to create DynamoDB table
 def create_table(table_name):
     try:
-        # check if the table already exists
-        existing_tables = dynamodb_client.list_tables()["TableNames"]
-        if table_name in existing_tables:
+        # check if the table already exists (one DescribeTable instead of paging through every table)
+        table = find_table(table_name)
+        if table:
             print(f"Table '{table_name}' already exists.")
+
+            # local secondary indexes can only be added when a table is created
+            index_names = [index['IndexName'] for index in table.get('LocalSecondaryIndexes', [])]
+            if DUE_DATE_INDEX not in index_names:
+                print(f"Warning: table '{table_name}' has no '{DUE_DATE_INDEX}', due-date counts will filter the whole partition.")
+            if UPDATED_AT_INDEX not in index_names:
+                print(f"Warning: table '{table_name}' has no '{UPDATED_AT_INDEX}', delta sync will filter the whole partition.")
+
+            # the summary consumer needs old images to undo modified and removed claims
+            enable_old_images_stream(table_name, table)
             return
 
         # function to create the table if it does not exist using parameters 
@@ -29,7 +89,15 @@ def create_table(table_name):
                 {
                     'AttributeName': 'ClaimID', 
                     'AttributeType': 'S'
-                } 
+                },
+                {
+                    'AttributeName': 'due_date',  # YYYY-MM-DD strings sort in date order
+                    'AttributeType': 'S'
+                },
+                {
+                    'AttributeName': 'UpdatedAt',  # ms since the epoch of the last write
+                    'AttributeType': 'N'
+                }
             ],
             KeySchema=[
                 {
@@ -41,10 +109,46 @@ def create_table(table_name):
                     'KeyType': 'RANGE'  # sort key to uniquely identify the claims
                 }
             ],
+            LocalSecondaryIndexes=[
+                {
+                    # per-user index ordered by due date so date windows are key range queries
+                    'IndexName': DUE_DATE_INDEX,
+                    'KeySchema': [
+                        {
+                            'AttributeName': 'UserID',
+                            'KeyType': 'HASH'
+                        },
+                        {
+                            'AttributeName': 'due_date',
+                            'KeyType': 'RANGE'
+                        }
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'ALL'
+                    }
+                },
+                {
+                    # per-user index ordered by last write, so "changed since" is a key range query
+                    'IndexName': UPDATED_AT_INDEX,
+                    'KeySchema': [
+                        {
+                            'AttributeName': 'UserID',
+                            'KeyType': 'HASH'
+                        },
+                        {
+                            'AttributeName': 'UpdatedAt',
+                            'KeyType': 'RANGE'
+                        }
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'ALL'  # changed claims are returned whole
+                    }
+                }
+            ],
             BillingMode='PAY_PER_REQUEST',  # pay per request for unpredictable workloads
             StreamSpecification={
                 'StreamEnabled': True,        # indicates if Dynamodb streams is to be enabled
-                'StreamViewType': 'NEW_IMAGE'  # captures the entire item after modified written to the stream
+                'StreamViewType': 'NEW_AND_OLD_IMAGES'  # captures the item before and after it was modified
             }
         )
         
@@ -53,24 +157,112 @@ def create_table(table_name):
         print(f"Error creating table: {e}")
 
 
+# function to make a table stream carry both images, as the summary consumer needs. The view
+# type of a stream cannot be changed, so a stream with another one is disabled and a new stream
+# (with a new ARN) enabled; writes in between are not streamed. Returns the stream ARN
+def enable_old_images_stream(table_name, table=None):
+    table = table or find_table(table_name)
+    specification = table.get('StreamSpecification', {})
+    if specification.get('StreamEnabled') and specification.get('StreamViewType') == 'NEW_AND_OLD_IMAGES':
+        return table['LatestStreamArn']
+
+    waiter = dynamodb_client.get_waiter('table_exists')  # waits until the table is ACTIVE again
+    if specification.get('StreamEnabled'):
+        print(f"Replacing the {specification.get('StreamViewType')} stream of table '{table_name}'.")
+        dynamodb_client.update_table(TableName=table_name, StreamSpecification={'StreamEnabled': False})
+        waiter.wait(TableName=table_name)
+    dynamodb_client.update_table(
+        TableName=table_name,
+        StreamSpecification={'StreamEnabled': True, 'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+    )
+    waiter.wait(TableName=table_name)
+    print(f"Table '{table_name}' streams NEW_AND_OLD_IMAGES now, run `python provision.py backfill` "
+          f"to recount claims written while it was switched.")
+    return find_table(table_name)['LatestStreamArn']
+
+
+# function to create the table holding one claim summary item per user
+def create_summary_table(table_name=SUMMARY_TABLE):
+    try:
+        if find_table(table_name):
+            print(f"Table '{table_name}' already exists.")
+            return
+
+        dynamodb_client.create_table(
+            TableName=table_name,
+            AttributeDefinitions=[
+                {
+                    'AttributeName': 'UserID',
+                    'AttributeType': 'S'
+                }
+            ],
+            KeySchema=[
+                {
+                    'AttributeName': 'UserID',
+                    'KeyType': 'HASH'  # one summary item per user
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        print(f"Table '{table_name}' created successfully.")
+    except ClientError as e:
+        print(f"Error creating summary table: {e}")
+
+
+# function to create the table of deleted claims; DynamoDB removes them after TOMBSTONE_RETENTION
+# through the ExpiresAt time to live attribute
+def create_tombstone_table(table_name=TOMBSTONE_TABLE):
+    try:
+        if find_table(table_name):
+            print(f"Table '{table_name}' already exists.")
+            return
+
+        dynamodb_client.create_table(
+            TableName=table_name,
+            AttributeDefinitions=[
+                {
+                    'AttributeName': 'UserID',
+                    'AttributeType': 'S'
+                },
+                {
+                    'AttributeName': 'Tombstone',
+                    'AttributeType': 'S'
+                }
+            ],
+            KeySchema=[
+                {
+                    'AttributeName': 'UserID',
+                    'KeyType': 'HASH'
+                },
+                {
+                    'AttributeName': 'Tombstone',
+                    'KeyType': 'RANGE'  # "<deleted at ms, zero padded>#<claim id>", in deletion order
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+        dynamodb_client.update_time_to_live(
+            TableName=table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'ExpiresAt'}
+        )
+        print(f"Table '{table_name}' created successfully.")
+    except ClientError as e:
+        print(f"Error creating tombstone table: {e}")
+
+
 # function to insert a claim into DynamoDB
-def add_claim_to_dynamoDB(user_id, claim_id, claim_title, claim_type, claim_details, file_url):
+def add_claim_to_dynamoDB(user_id, claim_id, claim_title, claim_type, claim_details, attachments=None):
     try:
         # importing functions from published library
         submission_date = get_submission_date()
         due_date = calculate_due_date(30)
 
-        # claim details for dynamodb
-        claim_item = {
-            'UserID': {'S': user_id},
-            'ClaimID': {'S': claim_id},
-            'ClaimTitle': {'S': claim_title},
-            'ClaimType': {'S': claim_type},
-            'ClaimDetails': {'S': claim_details},
-            'FileURL': {'S': file_url if file_url else ''},  # use anempty string if no file uploaded
-            'submission_date': {'S': submission_date},  
-            'due_date': {'S': due_date}                
-        }
+        # claim details for dynamodb, files are stored as their S3 key and metadata (left out if none uploaded)
+        claim = Claim(user_id, claim_id, claim_title, claim_type, claim_details,
+                      submission_date=submission_date, due_date=due_date, attachments=attachments,
+                      updated_at=now_ms())
+        claim_item = marshal(claim)
 
         # insert the claim into the DynamoDB table
         table_name = "ClaimsTable"  # to be matched with actual dynamodb table name
@@ -81,57 +273,387 @@ def add_claim_to_dynamoDB(user_id, claim_id, claim_title, claim_type, claim_deta
         )
 
         print(f"Claim with ClaimID {claim_id} added to DynamoDB.")
+        claims_cache.invalidate_group(user_id)
+        bump_claims_version(user_id)
         return response
 
     except ClientError as e:
         print(f"Error inserting claim: {e}")
         raise Exception(f"Error inserting claim: {e}")
 
-# function to fetch claims by UserID
-def get_claims_by_user_id(user_id):
+# function to lazily run a key-condition query against the claims table, yielding items
+# page by page so callers only pay for the partition (and index) they ask for
+def query_claims(key_condition, expression_values, index_name=None, **query_args):
+    query_params = {
+        'TableName': "ClaimsTable",
+        'KeyConditionExpression': key_condition,
+        'ExpressionAttributeValues': expression_values,
+        **query_args
+    }
+    if index_name:
+        query_params['IndexName'] = index_name
+
+    # the paginator follows LastEvaluatedKey so nothing past the first 1 MB page is dropped
+    paginator = dynamodb_client.get_paginator('query')
+    try:
+        for page in paginator.paginate(**query_params):
+            yield from page.get('Items', [])
+    except ClientError as e:
+        print(f"Error querying claims from DynamoDB: {e}")
+        raise Exception(f"Error fetching claims: {e}")
+
+# function to run a single bounded query page, returning the items and the LastEvaluatedKey
+def query_claims_page(key_condition, expression_values, limit, exclusive_start_key=None, index_name=None, **query_args):
+    query_params = {
+        'TableName': "ClaimsTable",
+        'KeyConditionExpression': key_condition,
+        'ExpressionAttributeValues': expression_values,
+        'Limit': limit,
+        **query_args
+    }
+    if index_name:
+        query_params['IndexName'] = index_name
+    if exclusive_start_key:
+        query_params['ExclusiveStartKey'] = exclusive_start_key
+
+    try:
+        response = dynamodb_client.query(**query_params)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+    except ClientError as e:
+        print(f"Error querying claims from DynamoDB: {e}")
+        raise Exception(f"Error fetching claims: {e}")
+
+# function to turn a LastEvaluatedKey into an opaque url-safe cursor for clients
+def encode_cursor(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+# function to turn a client cursor back into an ExclusiveStartKey, raising ValueError if it is
+# malformed or belongs to a different user
+def decode_cursor(cursor, user_id):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start_key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(start_key, dict) or start_key.get('UserID') != {'S': user_id}:
+        raise ValueError("Invalid cursor: cursor does not belong to this user")
+    return start_key
+
+# function to get the current time in ms since the epoch, the unit of UpdatedAt and sync tokens
+def now_ms():
+    return int(time.time() * 1000)
+
+# function to turn a point in time into an opaque sync token for one user
+def encode_sync_token(user_id, since_ms):
+    raw = json.dumps({'u': user_id, 't': since_ms}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+# function to read the point in time back from a sync token, raising ValueError if it is
+# malformed or belongs to a different user
+def decode_sync_token(token, user_id):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid sync token")
+
+    if not isinstance(value, dict) or not isinstance(value.get('t'), int):
+        raise ValueError("Invalid sync token")
+    if value.get('u') != user_id:
+        raise ValueError("Invalid sync token: token does not belong to this user")
+    return value['t']
+
+# function to hand out a sync token covering every write up to now (less the safety margin)
+def new_sync_token(user_id):
+    return encode_sync_token(user_id, now_ms() - SYNC_SAFETY_MARGIN_MS)
+
+# function to lazily iterate over every claim of one user using the UserID partition key;
+# claim IDs are time ordered, so newest_first reads the sort key backwards
+def iter_claims_by_user_id(user_id, newest_first=True):
+    items = query_claims(
+        "UserID = :user_id",
+        {':user_id': {'S': user_id}},
+        ScanIndexForward=not newest_first
+    )
+    for item in items:
+        yield unmarshal(item)
+
+# function to lazily iterate over the claims of one user submitted between two datetimes, using a
+# range key condition on the time-ordered claim IDs (claims with legacy uuid4 IDs are not matched)
+def iter_claims_submitted_between(user_id, start, end, newest_first=True):
+    start_id, end_id = claim_id_bounds(start, end)
+    items = query_claims(
+        "UserID = :user_id AND ClaimID BETWEEN :start_id AND :end_id",
+        {':user_id': {'S': user_id}, ':start_id': {'S': start_id}, ':end_id': {'S': end_id}},
+        ScanIndexForward=not newest_first
+    )
+    for item in items:
+        yield unmarshal(item)
+
+# function to fetch claims (as Claim objects) by UserID, either all of them or one page of `limit` claims
+# starting after `cursor`; returns the claims and the cursor of the next page (or None). Callers
+# that looked up the claims version pass it, so a page cached before a write is never returned
+def get_claims_by_user_id(user_id, limit=None, cursor=None, newest_first=True, version=None):
+    cache_key = (user_id, version, limit, cursor, newest_first)
+    cached = claims_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    # a first page without claims means the user has none, which is cached for a shorter time
+    result = _load_claims_by_user_id(user_id, version, limit, cursor, newest_first)
+    claims_cache.set(cache_key, result, group=user_id, negative=not result[0] and not cursor)
+    return result
+
+# concurrent cache misses for the same page share one DynamoDB query; the version is part of the
+# key, so a reader of a new version never gets the result of a query started before the write
+@single_flight
+def _load_claims_by_user_id(user_id, version, limit, cursor, newest_first):
+    if limit is None and cursor is None:
+        return list(iter_claims_by_user_id(user_id, newest_first)), None
+
+    start_key = decode_cursor(cursor, user_id) if cursor else None
+    items, last_evaluated_key = query_claims_page(
+        "UserID = :user_id",
+        {':user_id': {'S': user_id}},
+        limit or 50,
+        exclusive_start_key=start_key,
+        ScanIndexForward=not newest_first
+    )
+    return [unmarshal(item) for item in items], encode_cursor(last_evaluated_key)
+
+# function to work out the inclusive YYYY-MM-DD window from today (UTC) to `days` from now
+def _due_date_window(days):
+    today = datetime.now(timezone.utc).date()
+    return today.isoformat(), (today + timedelta(days=days)).isoformat()
+
+# function to count the claims of one user due in the next `days` days without returning the items
+@single_flight
+def count_claims_due_by_user_id(user_id, days):
+    start_date, end_date = _due_date_window(days)
+    expression_values = {
+        ':user_id': {'S': user_id},
+        ':start_date': {'S': start_date},
+        ':end_date': {'S': end_date}
+    }
+    paginator = dynamodb_client.get_paginator('query')
+    try:
+        try:
+            pages = paginator.paginate(
+                TableName="ClaimsTable",
+                IndexName=DUE_DATE_INDEX,
+                KeyConditionExpression="UserID = :user_id AND due_date BETWEEN :start_date AND :end_date",
+                ExpressionAttributeValues=expression_values,
+                Select='COUNT'
+            )
+            return sum(page['Count'] for page in pages)
+        except ClientError as e:
+            if not is_missing_index_error(e, DUE_DATE_INDEX):
+                raise
+            # older tables have no due-date index, so read the user's partition and filter instead
+            pages = paginator.paginate(
+                TableName="ClaimsTable",
+                KeyConditionExpression="UserID = :user_id",
+                FilterExpression="due_date BETWEEN :start_date AND :end_date",
+                ExpressionAttributeValues=expression_values,
+                Select='COUNT'
+            )
+            return sum(page['Count'] for page in pages)
+    except ClientError as e:
+        print(f"Error counting due claims in DynamoDB: {e}")
+        raise Exception(f"Error counting due claims: {e}")
+
+# function to check whether a user has at least one claim, reading a single key at most
+@single_flight
+def user_has_claims(user_id):
+    claims, _ = query_claims_page(
+        "UserID = :user_id",
+        {':user_id': {'S': user_id}},
+        1,
+        ProjectionExpression="ClaimID"
+    )
+    return bool(claims)
+
+# function to read the dashboard counters of a user with a single GetItem on the summary table
+# (maintained asynchronously from the claims stream, see components/claim_summary.py); returns
+# None while the stream consumer has not counted the user's claims, i.e. the item is missing or
+# only holds the claims version
+@single_flight
+def get_claim_summary(user_id):
     try:
-        # function to scan the table for items where the UserID matches the given user_id using paramters
-        # tablename, filterexpressions, expressionattributevalues
-        response = dynamodb_client.scan(
-            TableName="ClaimsTable",  
-            FilterExpression="UserID = :user_id",  # filter for user_id that dynamodb applies after the scan
-            ExpressionAttributeValues={':user_id': {'S': user_id}}  # value that can be substituted :user_id with actual value
+        response = dynamodb_client.get_item(
+            TableName=SUMMARY_TABLE,
+            Key={'UserID': {'S': user_id}},
+            ConsistentRead=True  # as current as the claims version read just before it
         )
+    except ClientError as e:
+        print(f"Error fetching claim summary from DynamoDB: {e}")
+        raise Exception(f"Error fetching claim summary: {e}")
 
-         # process claims to add submission_date and due_date as strings
-        claims = response.get('Items', [])
-        for claim in claims:
-            claim['submission_date'] = claim.get('submission_date', {}).get('S', "N/A")
-            claim['due_date'] = claim.get('due_date', {}).get('S', "N/A")
+    item = response.get('Item')
+    return summarize(item) if item and TOTAL_ATTRIBUTE in item else None
 
+# function to give a user's claims a new version after a write to them succeeded; readers look
+# the version up before reading the claims, so they never pair the new version with old data.
+# The write is already committed when this runs, so a failure is only logged: other workers
+# may then serve the old version's pages (and 304s) until their cache entries expire
+def bump_claims_version(user_id):
+    try:
+        dynamodb_client.update_item(
+            TableName=SUMMARY_TABLE,
+            Key={'UserID': {'S': user_id}},
+            UpdateExpression="SET #version = :version",
+            ExpressionAttributeNames={'#version': VERSION_ATTRIBUTE},
+            ExpressionAttributeValues={':version': {'S': new_claims_version()}}
+        )
+    except ClientError as e:
+        print(f"Error updating claims version of user {user_id}: {e}")
 
-        
-        return claims
+# function to read a user's claims version with a consistent GetItem of that one attribute.
+# Users without one (claims written before versions existed, or no claims at all) share the
+# initial version until their first write, so reads never write to the summary table
+def get_claims_version(user_id):
+    try:
+        response = dynamodb_client.get_item(
+            TableName=SUMMARY_TABLE,
+            Key={'UserID': {'S': user_id}},
+            ProjectionExpression="#version",
+            ExpressionAttributeNames={'#version': VERSION_ATTRIBUTE},
+            ConsistentRead=True  # a user reloading right after a write must see the new version
+        )
+    except ClientError as e:
+        print(f"Error fetching claims version from DynamoDB: {e}")
+        raise Exception(f"Error fetching claims version: {e}")
+    return response.get('Item', {}).get(VERSION_ATTRIBUTE, {}).get('S') or INITIAL_CLAIMS_VERSION
 
+# function to count a user's claims per type and due date from the claims table, as the
+# attributes of a summary item
+def _count_claim_summary(user_id):
+    counters = {TOTAL_ATTRIBUTE: 0}
+    for claim in iter_claims_by_user_id(user_id):
+        counters[TOTAL_ATTRIBUTE] += 1
+        for prefix, value in ((TYPE_PREFIX, claim.claim_type), (DUE_PREFIX, claim.due_date)):
+            if value:
+                counters[prefix + value] = counters.get(prefix + value, 0) + 1
+    return {name: {'N': str(count)} for name, count in counters.items()}
+
+# function to work out a user's summary from the claims table without storing it, for users the
+# stream consumer has not counted yet; writing it could count claims twice, since their stream
+# records may still be applied afterwards
+@single_flight
+def compute_claim_summary(user_id):
+    return summarize(_count_claim_summary(user_id))
+
+# function to recompute a user's summary item from the claims table, e.g. after the stream
+# consumer failed part way through a batch or for users with claims from before it existed
+def rebuild_claim_summary(user_id):
+    item = _count_claim_summary(user_id)
+    item['UserID'] = {'S': user_id}
+    item[VERSION_ATTRIBUTE] = {'S': new_claims_version()}
+    try:
+        dynamodb_client.put_item(TableName=SUMMARY_TABLE, Item=item)
     except ClientError as e:
-        print(f"Error fetching claims from DynamoDB: {e}")
-        raise Exception(f"Error fetching claims: {e}")
-    
+        print(f"Error rebuilding claim summary: {e}")
+        raise Exception(f"Error rebuilding claim summary: {e}")
+    return summarize(item)
+
+# function to lazily iterate over the IDs of the users that have claims, reading only the keys
+def iter_claim_user_ids():
+    paginator = dynamodb_client.get_paginator('scan')
+    seen = set()
+    try:
+        for page in paginator.paginate(TableName="ClaimsTable", ProjectionExpression="UserID"):
+            for item in page.get('Items', []):
+                user_id = item['UserID']['S']
+                if user_id not in seen:
+                    seen.add(user_id)
+                    yield user_id
+    except ClientError as e:
+        print(f"Error scanning claims in DynamoDB: {e}")
+        raise Exception(f"Error scanning claims: {e}")
+
+# function to read a single claim by its key, returning None if it does not exist
+def get_claim(user_id, claim_id, consistent=False):
+    try:
+        response = dynamodb_client.get_item(
+            TableName="ClaimsTable",
+            Key=claim_key(user_id, claim_id),
+            ConsistentRead=consistent
+        )
+    except ClientError as e:
+        print(f"Error fetching claim from DynamoDB: {e}")
+        raise Exception(f"Error fetching claim: {e}")
+
+    item = response.get('Item')
+    return unmarshal(item) if item else None
+
+# function to append an uploaded file's metadata to an existing claim, unless a file with the
+# same key is already attached. The append is conditional on the attachment list still having
+# the length it had when it was checked, and checked again if another upload got in first
+def add_attachment_to_claim(user_id, claim_id, attachment):
+    for _ in range(ATTACH_ATTEMPTS):
+        claim = get_claim(user_id, claim_id, consistent=True)
+        # never create a claim from an upload, and keep the item size bounded
+        if claim is None:
+            raise ValueError("Claim not found")
+        if any(existing['key'] == attachment['key'] for existing in claim.attachment_list()):
+            raise ValueError(f"File {attachment['key']} is already attached to this claim")
+        count = len(claim.attachments or ())
+        if count >= MAX_ATTACHMENTS_PER_CLAIM:
+            raise ValueError(f"Claim already has {MAX_ATTACHMENTS_PER_CLAIM} attachments")
+
+        try:
+            response = dynamodb_client.update_item(
+                TableName="ClaimsTable",
+                Key=claim_key(user_id, claim_id),
+                UpdateExpression="SET Attachments = list_append(if_not_exists(Attachments, :empty), :attachment), "
+                                 "UpdatedAt = :updated_at",
+                ConditionExpression="attribute_exists(ClaimID) AND "
+                                    "(attribute_not_exists(Attachments) OR size(Attachments) = :count)",
+                ExpressionAttributeValues={
+                    ':empty': {'L': []},
+                    ':attachment': {'L': [encode_attachment(attachment)]},
+                    ':updated_at': {'N': str(now_ms())},
+                    ':count': {'N': str(count)}
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                continue
+            print(f"Error attaching file to claim: {e}")
+            raise Exception(f"Error attaching file to claim: {e}")
+
+        print(f"File {attachment['key']} attached to claim {claim_id}.")
+        claims_cache.invalidate_group(user_id)
+        bump_claims_version(user_id)
+        return response
+
+    raise Exception(f"Error attaching file to claim: claim {claim_id} kept changing, try again")
+
 # function to update a claim in DynamoDB
 def update_claim_in_dynamoDB(user_id, claim_id, claim_title, claim_type, claim_details):
     try:
         table_name = "ClaimsTable"  # to be matched with actual dynamodb table name
         # function to update a claim in dynamodb using parameters
         # tablename, key, updateexpressions and expressionattributevalues
+        update_expression, expression_values = marshal_updates(
+            title=claim_title,
+            claim_type=claim_type,
+            details=claim_details,
+            updated_at=now_ms()
+        )
         response = dynamodb_client.update_item(
             TableName=table_name,
-            Key={
-                'UserID': {'S': user_id},
-                'ClaimID': {'S': claim_id}
-            },
-            UpdateExpression="SET ClaimTitle = :title, ClaimType = :type, ClaimDetails = :details",
-            ExpressionAttributeValues={    #substitute token with actual values
-                ':title': {'S': claim_title},
-                ':type': {'S': claim_type},
-                ':details': {'S': claim_details}
-            }
+            Key=claim_key(user_id, claim_id),
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=expression_values  #substitute token with actual values
         )
         print(f"Claim with ClaimID {claim_id} updated successfully.")
+        claims_cache.invalidate_group(user_id)
+        bump_claims_version(user_id)
         return response
 
     except ClientError as e:
@@ -146,33 +668,129 @@ def delete_claim_from_dynamoDB(user_id, claim_id):
         # function to delete a claim in dynamodb using parameters tablename and key
         response = dynamodb_client.delete_item(
             TableName=table_name,
-            Key={
-                'UserID': {'S': user_id},
-                'ClaimID': {'S': claim_id}
-            }
+            Key=claim_key(user_id, claim_id),
+            ReturnValues='ALL_OLD'  # the deleted item tells the caller which attachment to release
         )
         print(f"Claim with ClaimID {claim_id} deleted successfully.")
+        claims_cache.invalidate_group(user_id)
+        if response.get('Attributes'):
+            try:
+                add_tombstone(user_id, claim_id)
+            except Exception as e:
+                # the claim is gone either way; syncing clients only drop it on their next full read
+                print(e)
+        bump_claims_version(user_id)
         return response
 
     except ClientError as e:
         print(f"Error deleting claim: {e}")
         raise Exception(f"Error deleting claim: {e}")
 
+# function to remember a deleted claim so clients syncing from an older token remove it too
+def add_tombstone(user_id, claim_id):
+    deleted_at = now_ms()
+    try:
+        dynamodb_client.put_item(
+            TableName=TOMBSTONE_TABLE,
+            Item={
+                'UserID': {'S': user_id},
+                'Tombstone': {'S': f"{deleted_at:013d}#{claim_id}"},
+                'ClaimID': {'S': claim_id},
+                'ExpiresAt': {'N': str(int(deleted_at / 1000 + TOMBSTONE_RETENTION.total_seconds()))}
+            }
+        )
+    except ClientError as e:
+        print(f"Error recording deleted claim: {e}")
+        raise Exception(f"Error recording deleted claim: {e}")
+
+# function to read the claims of one user written after `since` (ms since the epoch), on the
+# UpdatedAt index or, for tables created before it, by filtering the user's partition
+def _query_claims_updated_since(user_id, since):
+    query_params = {
+        'TableName': "ClaimsTable",
+        'ExpressionAttributeValues': {':user_id': {'S': user_id}, ':since': {'N': str(since)}},
+        'ConsistentRead': True
+    }
+    paginator = dynamodb_client.get_paginator('query')
+    try:
+        try:
+            pages = paginator.paginate(
+                IndexName=UPDATED_AT_INDEX,
+                KeyConditionExpression="UserID = :user_id AND UpdatedAt > :since",
+                **query_params
+            )
+            return [item for page in pages for item in page.get('Items', [])]
+        except ClientError as e:
+            if not is_missing_index_error(e, UPDATED_AT_INDEX):
+                raise
+            pages = paginator.paginate(
+                KeyConditionExpression="UserID = :user_id",
+                FilterExpression="UpdatedAt > :since",
+                **query_params
+            )
+            return [item for page in pages for item in page.get('Items', [])]
+    except ClientError as e:
+        print(f"Error querying claims from DynamoDB: {e}")
+        raise Exception(f"Error fetching claims: {e}")
+
+# function to list the claims of a user written after a sync token and the IDs of the ones deleted
+# since, with a token for the next sync; returns None when the token is older than the tombstones
+# kept, and the client has to read all claims again
+def get_claim_changes(user_id, sync_token):
+    since = decode_sync_token(sync_token, user_id)
+    # taken before reading, so nothing written while the queries run can be skipped next time
+    next_token = new_sync_token(user_id)
+    if since < now_ms() - TOMBSTONE_RETENTION.total_seconds() * 1000:
+        return None
+
+    changed = [unmarshal(item) for item in _query_claims_updated_since(user_id, since)]
+
+    deleted = []
+    paginator = dynamodb_client.get_paginator('query')
+    try:
+        pages = paginator.paginate(
+            TableName=TOMBSTONE_TABLE,
+            # "~" sorts after "#", so tombstones from the token's own ms are not repeated
+            KeyConditionExpression="UserID = :user_id AND Tombstone > :since",
+            ExpressionAttributeValues={':user_id': {'S': user_id}, ':since': {'S': f"{since:013d}~"}},
+            ProjectionExpression="ClaimID",
+            ConsistentRead=True
+        )
+        for page in pages:
+            deleted.extend(item['ClaimID']['S'] for item in page['Items'])
+    except ClientError as e:
+        print(f"Error fetching deleted claims from DynamoDB: {e}")
+        raise Exception(f"Error fetching deleted claims: {e}")
+
+    return changed, deleted, next_token
+
 # initialize the Lambda client for interacting with AWS Lambda
-lambda_client = boto3.client('lambda', region_name='us-east-1')
+lambda_client = client_proxy('lambda')
+
+# function to look up the mapping that feeds a stream into a Lambda function, or None
+def find_event_source_mapping(function_name, stream_arn):
+    response = lambda_client.list_event_source_mappings(EventSourceArn=stream_arn, FunctionName=function_name)
+    mappings = response.get('EventSourceMappings', [])
+    return mappings[0]['UUID'] if mappings else None
 
 #function to map dynamodb stream to lambda function
 def create_event_source_mapping(function_name, table_name):
     try:
         # Get the stream ARN for the table for event source mapping
-        response = dynamodb_client.describe_table(TableName=table_name)
-        
-        if 'Table' not in response or 'LatestStreamArn' not in response['Table']:
+        table = find_table(table_name)
+
+        if not table or 'LatestStreamArn' not in table:
             print("No stream ARN found, ensure the stream is enabled.")
             return
-        
-        stream_arn = response['Table']['LatestStreamArn']
-        
+
+        stream_arn = table['LatestStreamArn']
+
+        # a stream is mapped to the function once, however often this runs
+        mapping_id = find_event_source_mapping(function_name, stream_arn)
+        if mapping_id:
+            print(f"Event source mapping already exists: {mapping_id}")
+            return mapping_id
+
         # create event source mapping for DynamoDB stream to trigger the Lambda function
         event_source_mapping = lambda_client.create_event_source_mapping(
             EventSourceArn=stream_arn,
@@ -183,5 +801,17 @@ def create_event_source_mapping(function_name, table_name):
         )
         
         print(f"Event source mapping created successfully: {event_source_mapping}")
+
+        # mappings of earlier streams of the table (e.g. one replaced for its view type) are dropped
+        stream_prefix = stream_arn.split('/stream/')[0] + '/stream/'
+        paginator = lambda_client.get_paginator('list_event_source_mappings')
+        for page in paginator.paginate(FunctionName=function_name):
+            for mapping in page.get('EventSourceMappings', []):
+                old_arn = mapping.get('EventSourceArn', '')
+                if old_arn.startswith(stream_prefix) and old_arn != stream_arn:
+                    lambda_client.delete_event_source_mapping(UUID=mapping['UUID'])
+                    print(f"Event source mapping of replaced stream deleted: {mapping['UUID']}")
+
+        return event_source_mapping['UUID']
     except Exception as e:
         print(f"Error creating event source mapping: {str(e)}")
\ No newline at end of file
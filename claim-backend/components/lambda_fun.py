@@ -1,24 +1,30 @@
-import boto3
 import zipfile
 import os
 import io
+import base64
+import hashlib
 from botocore.exceptions import ClientError
+from components.aws_clients import client_proxy
 
-# Initialize the Boto3 clients
-lambda_client = boto3.client('lambda')
-sns_client = boto3.client('sns', region_name='us-east-1')  # Specify region if needed
+# shared Boto3 clients (the Lambda itself creates its own inside lambda_code)
+lambda_client = client_proxy('lambda')
+sns_client = client_proxy('sns')
 
 # Lambda function code as a string (This includes SNS integration and email report generation)
 lambda_code = """
 import json
 import boto3
 from sns import create_sns_topic  # Import the function from sns.py
+from claim_summary import apply_stream_records  # Keeps the per-user claim summary items up to date
 from utilities.email_report import generate_email_report  # Import utility function
 
 # Initialize SNS client
 sns_client = boto3.client('sns', region_name='us-east-1')  # Adjust region if necessary
 
 def lambda_handler(event, context):
+    # Fold inserts, modifications and removals into the per-user summary counters
+    apply_stream_records(event['Records'])
+
     # Iterate through the records in the DynamoDB Stream event
     for record in event['Records']:
         if record['eventName'] == 'INSERT':  # Process only INSERT events (for new claims)
@@ -64,6 +70,16 @@ def lambda_handler(event, context):
     }
 """
 
+# fixed timestamp for the files in the deployment package, so the same code always gives the same
+# zip and its hash can be compared with the CodeSha256 of the deployed function
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def _write_zip_entry(zip_file, name, data):
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    zip_file.writestr(info, data)
+
 def get_lambda_zip_bytes():
     """
     Creates an in-memory zip file containing the Lambda function code and all required components.
@@ -74,26 +90,68 @@ def get_lambda_zip_bytes():
     # Create a zip file and add the lambda code and necessary components
     with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
         # Add the lambda function code to the root of the zip file
-        zip_file.writestr('lambda_function.py', lambda_code)
+        _write_zip_entry(zip_file, 'lambda_function.py', lambda_code)
 
-        # Add the components directory and its contents (including sns.py and email_report.py)
+        # Add the components directory and its contents (including sns.py and email_report.py),
+        # in a fixed order and without compiled files
         components_dir = 'components'
         for folder_name, subfolders, filenames in os.walk(components_dir):
-            for filename in filenames:
+            subfolders[:] = sorted(folder for folder in subfolders if folder != '__pycache__')
+            for filename in sorted(filenames):
                 file_path = os.path.join(folder_name, filename)
                 # Write the file with the correct relative path
-                zip_file.write(file_path, os.path.relpath(file_path, components_dir))
+                with open(file_path, 'rb') as f:
+                    _write_zip_entry(zip_file, os.path.relpath(file_path, components_dir), f.read())
 
     # Get the byte content of the zip file
     buffer.seek(0)
     return buffer.read()
 
+# function to compute the hash Lambda reports as CodeSha256 for a deployment package
+def code_sha256(zip_bytes):
+    return base64.b64encode(hashlib.sha256(zip_bytes).digest()).decode()
+
+
+# function to look up the ARN of an existing Lambda function, or None if there is no such function
+def find_lambda_function(function_name):
+    try:
+        return lambda_client.get_function(FunctionName=function_name)['Configuration']['FunctionArn']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return None
+        raise
+
+# function to bring an existing Lambda function up to date: its code is replaced when the
+# deployed package differs from the current one, its role and handler when they changed
+def update_lambda_function(function_name, role_arn, handler):
+    try:
+        configuration = lambda_client.get_function(FunctionName=function_name)['Configuration']
+        updated = []
+
+        zip_bytes = get_lambda_zip_bytes()
+        if configuration.get('CodeSha256') != code_sha256(zip_bytes):
+            lambda_client.update_function_code(FunctionName=function_name, ZipFile=zip_bytes)
+            # a function accepts no other update until this one is done
+            lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+            updated.append('code')
+
+        if configuration.get('Role') != role_arn or configuration.get('Handler') != handler:
+            lambda_client.update_function_configuration(FunctionName=function_name, Role=role_arn, Handler=handler)
+            lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+            updated.append('configuration')
+
+        if not updated:
+            return f"Lambda function '{function_name}' is up to date."
+        return f"Lambda function '{function_name}' updated ({', '.join(updated)})."
+    except ClientError as e:
+        print(f"Error updating Lambda function: {e}")
+        raise Exception(f"Error updating Lambda function: {e}")
 
 def create_lambda_function(function_name, role_arn, handler):
-    # create a lambda function
+    # create a lambda function, or update the one that already exists
     try:
-        response = lambda_client.get_function(FunctionName=function_name)
-        return f"Lambda function '{function_name}' already exists."
+        lambda_client.get_function(FunctionName=function_name)
+        return update_lambda_function(function_name, role_arn, handler)
     except ClientError as e:
         # when the function does not exist
         if e.response['Error']['Code'] == 'ResourceNotFoundException':
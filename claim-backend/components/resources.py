@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+# names of the AWS resources the app uses; `python provision.py apply` creates whatever is missing
+USER_POOL_NAME = "claimSure-user-pool"
+APP_CLIENT_NAME = "my_app_client"
+CLAIMS_TABLE = "ClaimsTable"
+BUCKET_NAME = "claimsure-app-bucket-cpp"
+TOPIC_NAME = "ClaimSubmissionTopic"
+LAMBDA_FUNCTION_NAME = "claimsure-email-report"
+LAMBDA_ROLE_ARN = "arn:aws:iam::298550657963:role/LabRole"  # permission for making Lambda work
+LAMBDA_HANDLER = "lambda_function.lambda_handler"  # lambda handler function
+
+# resolved IDs are kept in this manifest, so restarts reuse them without any AWS calls
+MANIFEST_PATH = os.environ.get(
+    'CLAIMSURE_MANIFEST',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources.json')
+)
+
+# environment variables that override the manifest, e.g. in containers with a read-only disk
+RESOURCE_ENVIRONMENT = {
+    'user_pool_id': 'CLAIMSURE_USER_POOL_ID',
+    'app_client_id': 'CLAIMSURE_APP_CLIENT_ID',
+    'topic_arn': 'CLAIMSURE_TOPIC_ARN',
+    'table_stream_arn': 'CLAIMSURE_TABLE_STREAM_ARN',
+    'lambda_arn': 'CLAIMSURE_LAMBDA_ARN',
+    'bucket_name': 'CLAIMSURE_BUCKET_NAME',
+}
+
+_resolved = None
+_lock = threading.RLock()  # discovering the app client resolves the user pool first
+
+
+# function to describe the resources the app wants; the manifest is only trusted for the same config
+def desired_config():
+    return {
+        'region': os.environ.get('AWS_REGION', 'us-east-1'),
+        'user_pool': USER_POOL_NAME,
+        'app_client': APP_CLIENT_NAME,
+        'claims_table': CLAIMS_TABLE,
+        'bucket': BUCKET_NAME,
+        'topic': TOPIC_NAME,
+        'lambda_function': LAMBDA_FUNCTION_NAME,
+        'lambda_role': LAMBDA_ROLE_ARN,
+    }
+
+def config_fingerprint():
+    return hashlib.sha256(json.dumps(desired_config(), sort_keys=True).encode()).hexdigest()
+
+
+# function to read the resolved IDs from the manifest; a missing, unreadable or stale manifest
+# (written for a different config) gives an empty dict
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable resource manifest {path}: {e}")
+        return {}
+
+    if manifest.get('fingerprint') != config_fingerprint():
+        print(f"Resource manifest {path} is stale, resources will be looked up again.")
+        return {}
+    return dict(manifest.get('resources', {}))
+
+
+# function to write the resolved IDs to the manifest; the file is replaced atomically, so
+# workers starting at the same time never read half of it
+def write_manifest(resources, path=MANIFEST_PATH):
+    manifest = {
+        'fingerprint': config_fingerprint(),
+        'resolved_at': datetime.now(timezone.utc).isoformat(),
+        'resources': resources,
+    }
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, path)
+    except OSError as e:
+        print(f"Could not write resource manifest {path}: {e}")
+
+
+# function to look up a resource that is not in the manifest; read only, serving processes
+# never create resources
+def _discover(name):
+    if name == 'user_pool_id':
+        from components.cognito import find_user_pool
+        return find_user_pool(USER_POOL_NAME)
+    if name == 'app_client_id':
+        from components.cognito import find_app_client
+        return find_app_client(get_resource('user_pool_id'), APP_CLIENT_NAME)
+    if name == 'topic_arn':
+        from components.sns import find_sns_topic
+        return find_sns_topic(TOPIC_NAME)
+    if name == 'table_stream_arn':
+        from components.dynamoDB import find_table
+        table = find_table(CLAIMS_TABLE)
+        return table.get('LatestStreamArn') if table else None
+    if name == 'lambda_arn':
+        from components.lambda_fun import find_lambda_function
+        return find_lambda_function(LAMBDA_FUNCTION_NAME)
+    if name == 'bucket_name':
+        from components.s3 import bucket_exists
+        return BUCKET_NAME if bucket_exists(BUCKET_NAME) else None
+    raise KeyError(name)
+
+
+# function to get the ID of a provisioned resource: from the environment, else the manifest,
+# else a lookup whose result is added to the manifest for the next start
+def get_resource(name):
+    resolved = _resolved
+    if resolved is not None and name in resolved:
+        return resolved[name]
+
+    with _lock:
+        _load()
+        if name not in _resolved:
+            value = _discover(name)
+            if value is None:
+                raise LookupError(f"Resource '{name}' not found, run `python provision.py apply` first")
+            _resolved[name] = value
+            write_manifest({key: _resolved[key] for key in _resolved if key not in _overridden()})
+        return _resolved[name]
+
+
+# names whose value comes from the environment, which are never written to the manifest
+def _overridden():
+    return {name for name, variable in RESOURCE_ENVIRONMENT.items() if os.environ.get(variable)}
+
+
+# function to fill the per-process cache once, environment first
+def _load():
+    global _resolved
+    if _resolved is None:
+        resolved = load_manifest()
+        for name, variable in RESOURCE_ENVIRONMENT.items():
+            if os.environ.get(variable):
+                resolved[name] = os.environ[variable]
+        _resolved = resolved
+
+
+# function to forget the resolved IDs, e.g. after `provision.py apply` wrote a new manifest
+def reset_resources():
+    global _resolved
+    with _lock:
+        _resolved = None
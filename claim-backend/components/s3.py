@@ -1,18 +1,74 @@
-import boto3
 from botocore.exceptions import ClientError
 from werkzeug.utils import secure_filename
+from components.cache import TTLCache, MISSING
+from components.aws_clients import client_proxy
+from components.resources import BUCKET_NAME
 
 # Initialize an S3 client 
-s3_client = boto3.client('s3', region_name='us-east-1')
+s3_client = client_proxy('s3')
 
-bucket_name = "claimsure-app-bucket-cpp" #defining the bucket name
+bucket_name = BUCKET_NAME #defining the bucket name
 
+# presigned download URLs are created when claims are read and reused until close to expiry
+SIGNED_URL_EXPIRATION = 3600
+SIGNED_URL_REFRESH_MARGIN = 600  # never hand out a URL with less than 10 minutes left
+signed_url_cache = TTLCache(max_entries=10000, ttl=SIGNED_URL_EXPIRATION - SIGNED_URL_REFRESH_MARGIN)
+
+# transfer settings for uploads going through the app: multipart above 8MB, 4 parts in flight;
+# built on first upload so importing this module does not import boto3
+_transfer_config = None
+
+def get_transfer_config():
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=4,
+            use_threads=True
+        )
+    return _transfer_config
+
+# limits enforced by S3 itself on direct browser uploads
+MAX_ATTACHMENT_SIZE = 50 * 1024 * 1024  # 50MB, same limit as the submit form
+ALLOWED_CONTENT_TYPES = (
+    'application/pdf',
+    'image/jpeg',
+    'image/png',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'text/plain'
+)
+
+
+# function to check whether a bucket exists (and is ours to use)
+def bucket_exists(bucket_name):
+    try:
+        s3_client.head_bucket(Bucket=bucket_name)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchBucket'):
+            return False
+        raise
+
+# CORS rule that lets browsers upload attachments straight to the bucket with presigned POST
+# policies (and PUT multipart upload parts)
+UPLOAD_CORS_RULE = {
+    'AllowedMethods': ['POST', 'PUT', 'GET'],
+    'AllowedOrigins': ['*'],
+    'AllowedHeaders': ['*'],
+    'ExposeHeaders': ['ETag'],
+    'MaxAgeSeconds': 3000
+}
 
 def create_s3_bucket(bucket_name, region=None):
     # function to create s3 bucket using parameters bucket, createbucketconfiguration
     try:
         # Check if the bucket already exists
         s3_client.head_bucket(Bucket=bucket_name)
+        # buckets created before direct uploads may lack the rule the browser needs
+        configure_bucket_cors(bucket_name)
         return f"Bucket '{bucket_name}' already exists."
     except ClientError as e:
         if e.response['Error']['Code'] == '404':
@@ -28,18 +84,47 @@ def create_s3_bucket(bucket_name, region=None):
                         'LocationConstraint': region #specify region for bucket
                     }
                 )
+            configure_bucket_cors(bucket_name)
             return f"Bucket '{bucket_name}' created successfully."
         else:
             return f"Error checking bucket: {e.response['Error']['Message']}"
 
-def upload_file_to_s3(user_id, claim_id, file):
+# function to read the CORS rules of a bucket, an empty list if it has none
+def get_bucket_cors_rules(bucket_name):
+    try:
+        return s3_client.get_bucket_cors(Bucket=bucket_name).get('CORSRules', [])
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchCORSConfiguration':
+            return []
+        raise Exception(f"Error reading bucket CORS: {e}")
+
+# function to check whether a bucket has the CORS rule direct uploads need
+def bucket_allows_uploads(bucket_name):
+    return any(
+        all(rule.get(name) == value for name, value in UPLOAD_CORS_RULE.items() if name != 'MaxAgeSeconds')
+        for rule in get_bucket_cors_rules(bucket_name)
+    )
+
+def configure_bucket_cors(bucket_name):
+    # allow browsers to POST attachments straight to the bucket, keeping any other rules it has
+    try:
+        if bucket_allows_uploads(bucket_name):
+            return
+        rules = get_bucket_cors_rules(bucket_name) + [UPLOAD_CORS_RULE]
+        s3_client.put_bucket_cors(Bucket=bucket_name, CORSConfiguration={'CORSRules': rules})
+        print(f"Upload CORS rule added to bucket '{bucket_name}'.")
+    except Exception as e:
+        print(f"Error configuring bucket CORS: {e}")
+
+def upload_file_to_s3(user_id, claim_id, file, filename=None):
     try:
         # secure the filename and create a unique file key
-        filename = secure_filename(file.filename)
+        filename = filename or secure_filename(file.filename)
         file_key = f"{user_id}/{claim_id}/{filename}"
 
         # function to Upload the file to the S3 bucket
-        s3_client.upload_fileobj(file, bucket_name, file_key)
+        s3_client.upload_fileobj(file, bucket_name, file_key, Config=get_transfer_config(),
+                                 ExtraArgs={'ContentType': file.mimetype or 'application/octet-stream'})
 
         # Construct the file URL
         file_url = f"https://{bucket_name}.s3.amazonaws.com/{file_key}"
@@ -48,16 +133,61 @@ def upload_file_to_s3(user_id, claim_id, file):
     except ClientError as e:
         raise Exception(f"Error uploading file to S3: {e}")
     
-def generate_presigned_url(user_id, claim_id, filename, expiration=3600):
-    """Generate a pre-signed URL to access an S3 object"""
+def delete_file_from_s3(user_id, claim_id, filename):
     try:
-        # Construct the S3 object key (path)
+        # remove a single claim attachment, e.g. when the claim could not be saved
         file_key = f"{user_id}/{claim_id}/{filename}"
-        
+        s3_client.delete_object(Bucket=bucket_name, Key=file_key)
+    except ClientError as e:
+        raise Exception(f"Error deleting file from S3: {e}")
+
+def generate_presigned_url_for_key(file_key, expiration=3600):
+    """Generate a pre-signed URL to access an S3 object by its key"""
+    try:
         # Generate the pre-signed URL
         response = s3_client.generate_presigned_url('get_object',
                                                     Params={'Bucket': bucket_name, 'Key': file_key},
                                                     ExpiresIn=expiration)
         return response
     except ClientError as e:
-        raise Exception(f"Error generating presigned URL: {e}")
\ No newline at end of file
+        raise Exception(f"Error generating presigned URL: {e}")
+
+def get_signed_url(file_key, expiration=SIGNED_URL_EXPIRATION):
+    """Return a presigned download URL for a key, reusing a cached one while it has time left"""
+    cache_key = (file_key, expiration)
+    url = signed_url_cache.get(cache_key)
+    if url is MISSING:
+        url = generate_presigned_url_for_key(file_key, expiration)
+        signed_url_cache.set(cache_key, url, ttl=max(expiration - SIGNED_URL_REFRESH_MARGIN, 0))
+    return url
+
+def generate_presigned_post(user_id, claim_id, filename, content_type, expiration=600):
+    """
+    Generate a presigned POST policy that lets a browser upload one attachment straight to S3.
+    The policy pins the object key under {user_id}/{claim_id}/, the content type and the size.
+    """
+    try:
+        file_key = f"{user_id}/{claim_id}/{secure_filename(filename)}"
+        response = s3_client.generate_presigned_post(
+            Bucket=bucket_name,
+            Key=file_key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, MAX_ATTACHMENT_SIZE]
+            ],
+            ExpiresIn=expiration
+        )
+        return {'url': response['url'], 'fields': response['fields'], 'key': file_key}
+    except ClientError as e:
+        raise Exception(f"Error generating presigned POST: {e}")
+
+def get_file_metadata(file_key):
+    """Return the size and content type of an uploaded object, or None if it does not exist"""
+    try:
+        response = s3_client.head_object(Bucket=bucket_name, Key=file_key)
+        return {'size': response['ContentLength'], 'content_type': response.get('ContentType')}
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise Exception(f"Error reading file metadata from S3: {e}")
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from components.s3 import s3_client, bucket_name
+
+# defaults for streaming uploads, every one of them can be overridden per call
+STREAM_PART_SIZE = 8 * 1024 * 1024       # S3 needs at least 5MB for every part but the last
+STREAM_MAX_CONCURRENCY = 4               # parts uploaded at the same time by one request
+STREAM_MAX_MEMORY = 32 * 1024 * 1024     # buffered bytes per request (read ahead + in flight)
+STREAM_MAX_SIZE = 1024 * 1024 * 1024     # 1GB
+
+# pool shared by all streaming uploads of the worker
+stream_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='s3-stream')
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+# function to read exactly `size` bytes from a stream unless it ends first
+def _read_part(stream, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def stream_upload_to_s3(stream, file_key, content_type, part_size=STREAM_PART_SIZE,
+                        max_concurrency=STREAM_MAX_CONCURRENCY, max_memory=STREAM_MAX_MEMORY,
+                        max_size=STREAM_MAX_SIZE):
+    """
+    Pipe a request body into S3 as it arrives, without spooling it to disk.
+
+    Parts are read from the stream and uploaded in the background while the next part is being
+    received. At most max_memory bytes are buffered at once, and the upload is aborted with
+    UploadTooLarge once more than max_size bytes arrive. Returns the key, size and SHA-256 of
+    the uploaded object.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+
+    first_part = _read_part(stream, part_size)
+    hasher.update(first_part)
+    size += len(first_part)
+    if size > max_size:
+        raise UploadTooLarge(f"File exceeds {max_size} bytes")
+
+    # small files fit in one request, no multipart upload needed
+    if len(first_part) < part_size:
+        try:
+            s3_client.put_object(Bucket=bucket_name, Key=file_key, Body=first_part, ContentType=content_type)
+        except ClientError as e:
+            raise Exception(f"Error uploading file to S3: {e}")
+        return {'key': file_key, 'size': size, 'sha256': hasher.hexdigest()}
+
+    try:
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket_name, Key=file_key, ContentType=content_type
+        )['UploadId']
+    except ClientError as e:
+        raise Exception(f"Error uploading file to S3: {e}")
+
+    # one slot per part that may be held in memory: the one being read plus the ones uploading
+    slots = threading.BoundedSemaphore(max(1, min(max_concurrency, max_memory // part_size - 1)))
+
+    def upload_part(part_number, body):
+        try:
+            response = s3_client.upload_part(
+                Bucket=bucket_name, Key=file_key, UploadId=upload_id, PartNumber=part_number, Body=body
+            )
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        finally:
+            slots.release()
+
+    futures = []
+    try:
+        part_number = 1
+        body = first_part
+        while body:
+            slots.acquire()
+            futures.append(stream_pool.submit(upload_part, part_number, body))
+
+            body = _read_part(stream, part_size)
+            hasher.update(body)
+            size += len(body)
+            if size > max_size:
+                raise UploadTooLarge(f"File exceeds {max_size} bytes")
+            part_number += 1
+
+        parts = [future.result() for future in futures]
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name, Key=file_key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+        )
+    except BaseException as e:
+        for future in futures:
+            future.cancel()
+        try:
+            s3_client.abort_multipart_upload(Bucket=bucket_name, Key=file_key, UploadId=upload_id)
+        except ClientError as abort_error:
+            print(f"Error aborting streaming upload: {abort_error}")
+        if isinstance(e, ClientError):
+            raise Exception(f"Error uploading file to S3: {e}")
+        raise
+
+    return {'key': file_key, 'size': size, 'sha256': hasher.hexdigest(), 'parts': len(parts)}
+
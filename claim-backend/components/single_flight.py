@@ -0,0 +1,66 @@
+import functools
+import threading
+
+
+class _Call:
+    # one in-flight call whose outcome is shared by every caller waiting on it
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function and the
+    callers that arrive while it is running wait for it and receive the same result (or error).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats['shared'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # later callers start a fresh call, only the ones already waiting share this one
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+# one group per worker process, shared by every decorated function
+claim_reads = SingleFlight()
+
+
+# decorator to coalesce concurrent calls of a function made with the same arguments
+def single_flight(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        key = (function.__qualname__, args, tuple(sorted(kwargs.items())))
+        return claim_reads.do(key, function, *args, **kwargs)
+    return wrapper
@@ -1,22 +1,31 @@
-import boto3
 from botocore.exceptions import ClientError
+try:
+    from components.aws_clients import client_proxy
+except ImportError:
+    # this module is also packaged into the email Lambda, where components/ is the zip root
+    from aws_clients import client_proxy
 
 # Initialize the SNS client
-sns_client = boto3.client('sns', region_name='us-east-1')  
+sns_client = client_proxy('sns')
+
+# function to look up the ARN of an existing topic, or None if there is no such topic
+def find_sns_topic(topic_name):
+    # check if the topic already exists by paging through all topics (100 per call)
+    paginator = sns_client.get_paginator('list_topics')
+    for page in paginator.paginate():
+        for topic in page.get('Topics', []):
+            arn = topic['TopicArn']
+            if arn.split(':')[-1] == topic_name:  # the topic name is the last part of the ARN
+                return arn
+    return None
 
 def create_sns_topic(topic_name):
     try:
-        # check if the topic already exists by listing all topics
-        existing_topics = sns_client.list_topics()
-        
-        # Look for the topic in the list of existing topics
-        existing_arns = [topic['TopicArn'] for topic in existing_topics.get('Topics', [])]
-        
         # If topic already exists, return the ARN of the existing topic
-        for arn in existing_arns:
-            if arn.endswith(topic_name):  # Check if the ARN ends with the topic name
-                print(f"SNS topic '{topic_name}' already exists with ARN: {arn}")
-                return arn
+        arn = find_sns_topic(topic_name)
+        if arn:
+            print(f"SNS topic '{topic_name}' already exists with ARN: {arn}")
+            return arn
 
         # function to create sns topic if the topic doesn't exist using parameters name
         response = sns_client.create_topic(
@@ -0,0 +1,190 @@
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+from flask import Response, abort, request, send_file
+try:
+    import brotli  # optional: without it only gzip variants are served
+except ImportError:
+    brotli = None
+
+# files of the react build that are worth compressing (images and fonts already are)
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/manifest+json', 'application/xml')
+MIN_COMPRESS_SIZE = 1024
+
+# bigger files (e.g. source maps of large bundles) are streamed from disk instead of kept in memory
+MAX_IN_MEMORY_SIZE = 4 * 1024 * 1024
+
+# names create-react-app puts a content hash in, e.g. static/js/main.3f2a9c1b.js or
+# static/media/logo.6ce24c58023cc2f8fd88fe9d219db6c6.svg; their content never changes
+FINGERPRINT_PATTERN = re.compile(r"\.[0-9a-f]{8,}\.")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"  # may be cached, but is checked with its ETag every time
+
+# Content-Encoding -> file extension of precompressed variants written next to the files
+ENCODING_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+
+class StaticAsset:
+    """One file of the build with its compressed variants, ETags and cache policy."""
+
+    def __init__(self, path, content_type, last_modified, fingerprinted):
+        self.path = path
+        self.content_type = content_type
+        self.last_modified = last_modified
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL
+        self.bodies = {}  # Content-Encoding ('identity', 'gzip', 'br') -> bytes
+        self.etags = {}   # one ETag per encoding, since each is a different representation
+        self.etag = None  # for files served from disk
+
+    def add_body(self, encoding, body, digest):
+        self.bodies[encoding] = body
+        self.etags[encoding] = digest if encoding == 'identity' else f"{digest}-{encoding}"
+
+
+def _is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _content_type(name):
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+# function to compress a body for an encoding; brotli at quality 11 takes seconds for a big
+# bundle, so `python -m components.static_assets` does that once after the build instead
+def _compress(encoding, body, best=False):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return brotli.compress(body, quality=11 if best else 6)
+
+
+# function to read the build directory once into a manifest of URL path -> StaticAsset.
+# Precompressed .br/.gz files next to a file are used as its variants, missing ones are
+# compressed here; a variant that is not smaller than the file is dropped
+def load_assets(build_dir):
+    assets = {}
+    if not build_dir or not os.path.isdir(build_dir):
+        print(f"No react build in {build_dir}, only the API is served.")
+        return assets
+
+    for directory, _, filenames in os.walk(build_dir):
+        for filename in filenames:
+            if filename.endswith(tuple(ENCODING_EXTENSIONS.values())):
+                continue  # read together with the file they belong to
+            file_path = os.path.join(directory, filename)
+            url_path = os.path.relpath(file_path, build_dir).replace(os.sep, '/')
+            stat = os.stat(file_path)
+            asset = StaticAsset(
+                file_path,
+                _content_type(filename),
+                datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                bool(FINGERPRINT_PATTERN.search(filename))
+            )
+
+            if stat.st_size > MAX_IN_MEMORY_SIZE:
+                asset.etag = f"{int(stat.st_mtime)}-{stat.st_size}"
+                assets[url_path] = asset
+                continue
+
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            digest = hashlib.sha256(body).hexdigest()[:20]
+            asset.add_body('identity', body, digest)
+
+            if _is_compressible(asset.content_type) and len(body) >= MIN_COMPRESS_SIZE:
+                for encoding, extension in ENCODING_EXTENSIONS.items():
+                    if os.path.exists(file_path + extension):
+                        with open(file_path + extension, 'rb') as f:
+                            compressed = f.read()
+                    elif encoding == 'br' and brotli is None:
+                        continue
+                    else:
+                        compressed = _compress(encoding, body)
+                    if len(compressed) < len(body):
+                        asset.add_body(encoding, compressed, digest)
+            assets[url_path] = asset
+
+    size = sum(len(body) for asset in assets.values() for body in asset.bodies.values())
+    print(f"Loaded {len(assets)} static assets ({size / 1024:.0f} KB with compressed variants).")
+    return assets
+
+
+# function to pick the smallest variant the client accepts, brotli before gzip
+def _choose_encoding(asset):
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.bodies and request.accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+
+# function to answer a request for the react app from the manifest: the file if the build has
+# it, else index.html so client side routes work. Missing files under static/ get a 404, so
+# a stale bundle name is not answered with html
+def serve_asset(assets, path):
+    asset = assets.get(path)
+    if asset is None:
+        if path.startswith('static/'):
+            abort(404)
+        asset = assets.get('index.html')
+        if asset is None:
+            abort(404)
+
+    if not asset.bodies:
+        # too big to keep in memory, the manifest already knows where it is
+        response = send_file(asset.path, mimetype=asset.content_type, etag=asset.etag,
+                             last_modified=asset.last_modified, conditional=True)
+        response.headers['Cache-Control'] = asset.cache_control
+        return response
+
+    encoding = _choose_encoding(asset)
+    response = Response(asset.bodies[encoding], content_type=asset.content_type)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = asset.cache_control
+    response.set_etag(asset.etags[encoding])
+    response.last_modified = asset.last_modified
+    # answers If-None-Match / If-Modified-Since with a 304 without a body
+    return response.make_conditional(request)
+
+
+# function to write the compressed variants next to the files of a build at the best (slow)
+# settings, so workers only load them; run after `npm run build`
+def precompress(build_dir):
+    written = 0
+    for directory, _, filenames in os.walk(build_dir):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            if filename.endswith(tuple(ENCODING_EXTENSIONS.values())) or not _is_compressible(_content_type(filename)):
+                continue
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            if len(body) < MIN_COMPRESS_SIZE:
+                continue
+            for encoding, extension in ENCODING_EXTENSIONS.items():
+                if encoding == 'br' and brotli is None:
+                    continue
+                with open(file_path + extension, 'wb') as f:
+                    f.write(_compress(encoding, body, best=True))
+                written += 1
+    print(f"Wrote {written} precompressed files in {build_dir}.")
+    return written
+
+
+# run with: python -m components.static_assets [build dir]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress the react build for serving.")
+    parser.add_argument('build_dir', nargs='?', default='build')
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed, only writing gzip variants.")
+    precompress(args.build_dir)
@@ -0,0 +1,176 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import ClientError
+from werkzeug.utils import secure_filename
+from components.s3 import s3_client, bucket_name
+
+# S3 multipart limits: every part except the last must be at least 5MB, at most 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# sessions are meant for large scans, capped well below the S3 object limit
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAX_SESSION_SIZE = 1024 * 1024 * 1024  # 1GB
+
+# incomplete uploads older than this are aborted by the janitor
+STALE_UPLOAD_AGE = timedelta(hours=24)
+JANITOR_INTERVAL_SECONDS = 3600
+
+
+# function to work out the part size and number of parts for an upload of `size` bytes
+def plan_parts(size, part_size=DEFAULT_PART_SIZE):
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+    return part_size, max(1, math.ceil(size / part_size))
+
+
+# function to check the size declared for an upload session
+def _check_session_size(size):
+    if size <= 0 or size > MAX_SESSION_SIZE:
+        raise ValueError(f"File size must be between 1 byte and {MAX_SESSION_SIZE} bytes")
+
+
+# function to work out the length of one part of an upload of `size` bytes; only the parts
+# planned for that size exist and the last one holds the rest
+def part_length(size, part_number):
+    part_size, part_count = plan_parts(size)
+    if part_number < 1 or part_number > part_count:
+        raise ValueError(f"Invalid part number {part_number}, this upload has {part_count} parts")
+    return min(part_size, size - (part_number - 1) * part_size)
+
+
+# function to start a resumable multipart upload for a claim attachment
+def initiate_upload_session(user_id, claim_id, filename, content_type, size):
+    _check_session_size(size)
+
+    file_key = f"{user_id}/{claim_id}/{secure_filename(filename)}"
+    part_size, part_count = plan_parts(size)
+    try:
+        response = s3_client.create_multipart_upload(
+            Bucket=bucket_name,
+            Key=file_key,
+            ContentType=content_type
+        )
+    except ClientError as e:
+        raise Exception(f"Error starting upload session: {e}")
+
+    return {
+        'key': file_key,
+        'upload_id': response['UploadId'],
+        'part_size': part_size,
+        'part_count': part_count
+    }
+
+
+# function to presign one upload URL per part so the client can PUT parts in parallel; each URL
+# is signed with the length of its part, so S3 refuses a part of any other size and an upload
+# can never grow beyond the size it was planned for
+def presign_part_urls(file_key, upload_id, size, part_numbers, expiration=3600):
+    _check_session_size(size)
+    urls = []
+    try:
+        for part_number in part_numbers:
+            url = s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': bucket_name,
+                    'Key': file_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number,
+                    'ContentLength': part_length(size, part_number)
+                },
+                ExpiresIn=expiration
+            )
+            urls.append({'part_number': part_number, 'url': url})
+    except ClientError as e:
+        raise Exception(f"Error presigning upload parts: {e}")
+    return urls
+
+
+# function to list the parts S3 has already received, which is what a client resumes from
+def list_uploaded_parts(file_key, upload_id):
+    parts = []
+    try:
+        paginator = s3_client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=bucket_name, Key=file_key, UploadId=upload_id):
+            for part in page.get('Parts', []):
+                parts.append({'part_number': part['PartNumber'], 'etag': part['ETag'], 'size': part['Size']})
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchUpload':
+            return None
+        raise Exception(f"Error listing uploaded parts: {e}")
+    return parts
+
+
+# function to assemble the uploaded parts into the final object, once they add up to the size
+# declared for the session; an upload larger than that is aborted instead
+def complete_upload_session(file_key, upload_id, size):
+    _check_session_size(size)
+    parts = list_uploaded_parts(file_key, upload_id)
+    if not parts:
+        raise ValueError("Upload session not found or no parts uploaded")
+
+    uploaded = sum(part['size'] for part in parts)
+    if uploaded > size:
+        abort_upload_session(file_key, upload_id)
+        raise ValueError(f"Uploaded parts add up to {uploaded} bytes, more than the {size} bytes "
+                         f"declared for this upload; the upload was aborted")
+    if uploaded < size:
+        raise ValueError(f"Upload incomplete: {uploaded} of {size} bytes received")
+
+    try:
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=file_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [{'PartNumber': part['part_number'], 'ETag': part['etag']} for part in parts]
+            }
+        )
+    except ClientError as e:
+        raise Exception(f"Error completing upload session: {e}")
+    return uploaded
+
+
+# function to cancel an upload session and free the parts stored so far
+def abort_upload_session(file_key, upload_id):
+    try:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=file_key, UploadId=upload_id)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchUpload':
+            raise Exception(f"Error aborting upload session: {e}")
+
+
+# function to abort every incomplete multipart upload older than `max_age`
+def abort_stale_uploads(max_age=STALE_UPLOAD_AGE):
+    cutoff = datetime.now(timezone.utc) - max_age
+    aborted = 0
+    try:
+        paginator = s3_client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=bucket_name):
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'] < cutoff:
+                    abort_upload_session(upload['Key'], upload['UploadId'])
+                    aborted += 1
+    except Exception as e:
+        print(f"Error sweeping stale uploads: {e}")
+    if aborted:
+        print(f"Aborted {aborted} stale upload sessions.")
+    return aborted
+
+
+# background janitor that periodically sweeps stale upload sessions
+_janitor_started = threading.Event()
+
+def start_upload_janitor(interval=JANITOR_INTERVAL_SECONDS, max_age=STALE_UPLOAD_AGE):
+    if _janitor_started.is_set():
+        return
+    _janitor_started.set()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            abort_stale_uploads(max_age)
+
+    threading.Thread(target=run, name='upload-janitor', daemon=True).start()
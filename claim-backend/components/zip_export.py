@@ -0,0 +1,88 @@
+import json
+import zipfile
+from botocore.exceptions import ClientError
+from components.s3 import s3_client, bucket_name
+from components.claim_model import unique_filename
+
+# size of the pieces read from S3 and handed to the client, which bounds the memory per export
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipSink:
+    """
+    Write-only file object for zipfile. It can tell its position but not seek, so zipfile writes
+    every entry in one pass with a trailing data descriptor, and the bytes written so far can be
+    drained after each chunk and sent to the client.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# function to list (archive name, S3 key) pairs for the attachments of some claims, with each
+# claim's own data as claim.json; claims are read lazily so big exports never load them all
+def export_entries(claims, folder_per_claim=True):
+    for claim in claims:
+        folder = f"{claim.claim_id}/" if folder_per_claim else ""
+        used_names = {'claim.json'}
+        yield f"{folder}claim.json", json.dumps(claim.to_json(), indent=2).encode()
+        for attachment in claim.attachment_list():
+            # two "scan.pdf" become scan.pdf and scan-2.pdf
+            name = unique_filename(attachment['name'] or attachment['key'].rsplit('/', 1)[-1], used_names)
+            used_names.add(name)
+            yield f"{folder}{name}", attachment['key']
+
+
+# generator that builds a zip archive on the fly from S3 objects; entries are (name, S3 key)
+# pairs, or (name, bytes) for small generated files. Objects are piped through in chunks, so
+# memory stays constant and nothing is written to disk whatever the size of the export
+def stream_zip(entries, chunk_size=EXPORT_CHUNK_SIZE):
+    sink = _ZipSink()
+    # attachments are mostly PDFs and images which are already compressed, storing them avoids
+    # burning CPU for a few percent of size
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, source in entries:
+            if isinstance(source, bytes):
+                archive.writestr(name, source)
+                yield sink.drain()
+                continue
+
+            try:
+                response = s3_client.get_object(Bucket=bucket_name, Key=source)
+            except ClientError as e:
+                # a missing object should not fail the rest of the export
+                print(f"Skipping {source} in zip export: {e}")
+                continue
+
+            info = zipfile.ZipInfo(name, date_time=response['LastModified'].timetuple()[:6])
+            info.file_size = response['ContentLength']  # lets zipfile pick zip64 for big files
+            body = response['Body']
+            try:
+                with archive.open(info, 'w') as entry:
+                    for chunk in body.iter_chunks(chunk_size):
+                        entry.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            finally:
+                body.close()
+            yield sink.drain()
+    # the central directory is written when the archive is closed
+    yield sink.drain()
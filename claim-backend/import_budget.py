@@ -0,0 +1,79 @@
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Reports how long a worker takes to import and build the app, per top-level package, so a new
+# import that slows down cold starts shows up before it is deployed:
+#
+#   python import_budget.py [--budget-ms 400] [--top 15] [--runs 3]
+#
+# exits with 1 when the boot time is over the budget or a module that should load lazily
+# (on the first request) was imported while booting
+
+BOOT_CODE = "from app import create_app; create_app()"
+
+# modules only the first request (or first AWS call) should import
+LAZY_MODULES = ('boto3', 's3transfer', 'jwt')
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# function to boot the app once in a fresh interpreter and read what -X importtime prints:
+# "import time: <self us> | <cumulative us> | <indented module name>"
+def measure_boot():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT_CODE],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Error booting the app: {result.stderr.strip().splitlines()[-1:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+# function to add up the time spent in each top-level package (Routes, components, flask, ...)
+def by_package(modules):
+    totals = defaultdict(int)
+    for name, self_us, _ in modules:
+        totals[name.split('.')[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def report(budget_ms, top=15, runs=3):
+    # the fastest of a few runs, so a busy machine does not fail the budget
+    modules = min((measure_boot() for _ in range(runs)), key=lambda ms: sum(m[1] for m in ms))
+    total_ms = sum(self_us for _, self_us, _ in modules) / 1000
+
+    print(f"{'package':<30} {'ms':>8} {'share':>7}")
+    for package, self_us in by_package(modules)[:top]:
+        print(f"{package:<30} {self_us / 1000:>8.1f} {self_us / 1000 / total_ms:>7.1%}")
+    print(f"{'total import time':<30} {total_ms:>8.1f} (budget {budget_ms} ms)")
+
+    problems = []
+    loaded = {name.split('.')[0] for name, _, _ in modules}
+    for module in LAZY_MODULES:
+        if module in loaded:
+            problems.append(f"{module} is imported while booting, it should only be imported on first use")
+    if total_ms > budget_ms:
+        problems.append(f"boot import time {total_ms:.1f} ms is over the budget of {budget_ms} ms")
+    for problem in problems:
+        print(f"Error: {problem}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import time of a ClaimSure worker per package.")
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 400)))
+    parser.add_argument('--top', type=int, default=15, help="number of packages to list")
+    parser.add_argument('--runs', type=int, default=3, help="boots to measure, the fastest one is reported")
+    args = parser.parse_args()
+
+    raise SystemExit(1 if report(args.budget_ms, args.top, args.runs) else 0)
@@ -0,0 +1,213 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from components.resources import USER_POOL_NAME, APP_CLIENT_NAME, CLAIMS_TABLE, BUCKET_NAME, TOPIC_NAME
+from components.resources import LAMBDA_FUNCTION_NAME, LAMBDA_ROLE_ARN, LAMBDA_HANDLER, RESOURCE_ENVIRONMENT
+from components.resources import MANIFEST_PATH, write_manifest
+from components.aws_clients import get_client
+from components.cognito import find_user_pool, create_user_pool, find_app_client, create_app_client
+from components.dynamoDB import find_table, create_table, create_summary_table, create_tombstone_table, TOMBSTONE_TABLE
+from components.dynamoDB import find_event_source_mapping, create_event_source_mapping
+from components.dynamoDB import iter_claim_user_ids, rebuild_claim_summary
+from components.claim_summary import SUMMARY_TABLE
+from components.attachment_store import BLOB_TABLE, create_blob_table
+from components.s3 import bucket_exists, bucket_allows_uploads, create_s3_bucket
+from components.sns import find_sns_topic, create_sns_topic
+from components.lambda_fun import find_lambda_function, create_lambda_function, update_lambda_function
+
+# Provisions the AWS resources of the app, so serving processes never have to:
+#
+#   python provision.py plan                      # show what exists and what would be created
+#   python provision.py apply [--manifest FILE] [--env-file FILE]
+#                                                 # create what is missing, independent resources in parallel,
+#                                                 # and deploy changed code to the existing Lambda function
+#   python provision.py backfill                  # count the claims of existing users into the summary table
+#
+# apply writes the resolved IDs to the resource manifest the serving processes read at start
+# (and, for deployments that pass them in the environment, to --env-file), see components/resources.py
+#
+# The summary table is kept up to date from the claims stream, which only sees claims written
+# after the stream consumer was deployed. Run backfill once after the first apply of a deployment
+# that already has claims; it replaces each user's counters with a fresh count, so run it while
+# few claims are being written (a claim written during it can be counted twice) and again if in doubt
+
+
+# functions returning a resource's ID (or name) if it exists, or None; `resolved` holds the IDs
+# of the resources it depends on
+def _find_table_stream(resolved):
+    table = find_table(CLAIMS_TABLE)
+    if not table:
+        return None
+    # the summary consumer miscounts on a stream without old images, so any other stream
+    # counts as missing and is replaced by apply
+    specification = table.get('StreamSpecification', {})
+    if not specification.get('StreamEnabled') or specification.get('StreamViewType') != 'NEW_AND_OLD_IMAGES':
+        return None
+    return table.get('LatestStreamArn')
+
+def _find_table_name(table_name):
+    return lambda resolved: table_name if find_table(table_name) else None
+
+def _find_app_client(resolved):
+    return find_app_client(resolved['user_pool_id'], APP_CLIENT_NAME) if resolved.get('user_pool_id') else None
+
+# a bucket without the CORS rule counts as missing, so apply adds it: browsers upload to it directly
+def _find_bucket(resolved):
+    return BUCKET_NAME if bucket_exists(BUCKET_NAME) and bucket_allows_uploads(BUCKET_NAME) else None
+
+def _find_mapping(resolved):
+    if not resolved.get('table_stream_arn') or not resolved.get('lambda_arn'):
+        return None
+    return find_event_source_mapping(LAMBDA_FUNCTION_NAME, resolved['table_stream_arn'])
+
+
+# functions creating a resource and returning its ID; creation is asynchronous for tables and
+# functions, so they wait until dependents can use them
+def _create_table_stream(resolved):
+    create_table(CLAIMS_TABLE)
+    get_client('dynamodb').get_waiter('table_exists').wait(TableName=CLAIMS_TABLE)
+    return _find_table_stream(resolved)
+
+def _create_summary_table(resolved):
+    create_summary_table(SUMMARY_TABLE)
+    return _find_table_name(SUMMARY_TABLE)(resolved)
+
+def _create_tombstone_table(resolved):
+    create_tombstone_table(TOMBSTONE_TABLE)
+    return _find_table_name(TOMBSTONE_TABLE)(resolved)
+
+def _create_blob_table(resolved):
+    create_blob_table(BLOB_TABLE)
+    return _find_table_name(BLOB_TABLE)(resolved)
+
+def _create_bucket(resolved):
+    print(create_s3_bucket(BUCKET_NAME))
+    return _find_bucket(resolved)
+
+def _create_lambda(resolved):
+    print(create_lambda_function(LAMBDA_FUNCTION_NAME, LAMBDA_ROLE_ARN, LAMBDA_HANDLER))
+    get_client('lambda').get_waiter('function_active_v2').wait(FunctionName=LAMBDA_FUNCTION_NAME)
+    return find_lambda_function(LAMBDA_FUNCTION_NAME)
+
+
+# resource name -> (resources it depends on, find, create)
+RESOURCES = {
+    'user_pool_id': ((), lambda resolved: find_user_pool(USER_POOL_NAME),
+                     lambda resolved: create_user_pool(USER_POOL_NAME)),
+    'app_client_id': (('user_pool_id',), _find_app_client,
+                      lambda resolved: create_app_client(resolved['user_pool_id'], APP_CLIENT_NAME)),
+    'table_stream_arn': ((), _find_table_stream, _create_table_stream),
+    'summary_table': ((), _find_table_name(SUMMARY_TABLE), _create_summary_table),
+    'tombstone_table': ((), _find_table_name(TOMBSTONE_TABLE), _create_tombstone_table),
+    'blob_table': ((), _find_table_name(BLOB_TABLE), _create_blob_table),
+    'bucket_name': ((), _find_bucket, _create_bucket),
+    'topic_arn': ((), lambda resolved: find_sns_topic(TOPIC_NAME), lambda resolved: create_sns_topic(TOPIC_NAME)),
+    # the consumer code is only deployed once the stream carries the images it needs
+    'lambda_arn': (('table_stream_arn',), lambda resolved: find_lambda_function(LAMBDA_FUNCTION_NAME), _create_lambda),
+    'event_source_mapping': (('table_stream_arn', 'lambda_arn'), _find_mapping,
+                             lambda resolved: create_event_source_mapping(LAMBDA_FUNCTION_NAME, CLAIMS_TABLE)),
+}
+
+
+# function to visit every resource, each one as soon as the resources it depends on are done,
+# independent ones in parallel; returns the resolved IDs and the names of the resources that
+# are missing (plan) or could not be created (apply)
+def _run(apply, max_workers=8):
+    resolved = {}
+    missing = []
+
+    def visit(name):
+        _, find, create = RESOURCES[name]
+        try:
+            value = find(resolved)
+            if value is None and apply:
+                value = create(resolved)
+            return value
+        except Exception as e:
+            print(f"Error provisioning {name}: {e}")
+            return None
+
+    pending = dict(RESOURCES)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='provision') as pool:
+        while pending or running:
+            for name, (dependencies, _, _) in list(pending.items()):
+                if any(dependency in missing for dependency in dependencies):
+                    missing.append(name)  # nothing to build on
+                    del pending[name]
+                elif all(dependency in resolved for dependency in dependencies):
+                    running[pool.submit(visit, name)] = name
+                    del pending[name]
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Circular dependencies between {sorted(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                value = future.result()
+                if value is None:
+                    missing.append(name)
+                else:
+                    resolved[name] = value
+    return resolved, missing
+
+
+def plan():
+    resolved, missing = _run(apply=False)
+    for name in RESOURCES:
+        if name in resolved:
+            print(f"  = {name}: {resolved[name]}")
+        else:
+            print(f"  + {name}: will be created")
+    print(f"Plan: {len(missing)} to create, {len(resolved)} unchanged.")
+    return missing
+
+
+def apply(env_file=None, manifest_path=MANIFEST_PATH):
+    resolved, missing = _run(apply=True)
+
+    # an existing function keeps its old code (e.g. without the summary updates) until it is replaced
+    if 'lambda_arn' in resolved:
+        try:
+            print(update_lambda_function(LAMBDA_FUNCTION_NAME, LAMBDA_ROLE_ARN, LAMBDA_HANDLER))
+        except Exception as e:
+            print(f"Error provisioning lambda_arn: {e}")
+            missing.append('lambda_arn')
+
+    for name in missing:
+        print(f"Error: {name} could not be provisioned")
+
+    write_manifest({name: resolved[name] for name in RESOURCE_ENVIRONMENT if name in resolved}, manifest_path)
+    print(f"Resolved resources written to {manifest_path}")
+
+    lines = [f"{variable}={resolved[name]}" for name, variable in RESOURCE_ENVIRONMENT.items() if name in resolved]
+    print("\n".join(lines))
+    if env_file:
+        with open(env_file, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"Resolved resource variables written to {env_file}")
+    return missing
+
+
+# function to recompute the summary item of every user with claims from the claims table
+def backfill(max_workers=8):
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backfill') as pool:
+        rebuilt = sum(1 for _ in pool.map(rebuild_claim_summary, iter_claim_user_ids()))
+    print(f"Rebuilt the claim summaries of {rebuilt} users.")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provision the AWS resources of ClaimSure.")
+    parser.add_argument('command', choices=['plan', 'apply', 'backfill'])
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help="resource manifest to write (apply only)")
+    parser.add_argument('--env-file', help="file to also write the resolved IDs to as variables (apply only)")
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        plan()
+    elif args.command == 'backfill':
+        backfill()
+    else:
+        raise SystemExit(1 if apply(args.env_file, args.manifest) else 0)
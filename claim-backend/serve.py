@@ -0,0 +1,164 @@
+import argparse
+import os
+import signal
+import time
+
+# Serves the app with gunicorn, a pre-forking WSGI server, instead of the flask dev server:
+#
+#   python serve.py [--bind 0.0.0.0:8000] [--workers N] [--threads N] [--max-requests N]
+#   python serve.py reload [--pid-file FILE]     # switch to new code without dropping requests
+#
+# The master imports the app and creates the AWS clients once, then forks the workers, which
+# share that memory copy-on-write. Each worker serves --threads requests at a time and is
+# replaced after --max-requests (plus some jitter, so they are not all replaced at once).
+#
+# Reloading:
+#   kill -HUP <master>     new workers with the same code and re-read resource manifest, old
+#                          ones finish their requests first
+#   python serve.py reload new master with the new code next to the old one; once its workers
+#                          are up the old master stops accepting and finishes its requests
+#
+# Sizing, from `python benchmark.py` on 1 CPU against a local DynamoDB emulator, 32 connections:
+#
+#   config    cached get-claims          uncached count-due (one GetItem)
+#             req/s   p50 ms   p99 ms    req/s   p50 ms   p99 ms
+#   1x1        872     35       239       192     171      367
+#   1x8        834     36       260       503      55      293
+#   1x16       962     29       269       588      49      316
+#   2x8        730     42       143       528      55      120
+#   4x8        665     47       103       535      57      122
+#
+#   --workers  one per CPU core, at least 2. A worker runs Python on one core at a time, so
+#              more workers than cores add memory and tail latency rather than throughput;
+#              with a single worker every recycle stalls all requests (the p99 of 1xN above).
+#              Each worker costs about 30 MB (14 MB of it private), the rest is shared.
+#   --threads  8. Most requests wait on DynamoDB, S3 or Cognito, and threads fill that wait:
+#              1 -> 8 threads gave 2.6x on the uncached route, 16 only 15% more. Against real
+#              AWS (10-30 ms per call instead of ~2 ms) the gain is larger, raise it to 16 if
+#              CPU stays low under load. workers x threads is the number of requests served
+#              at once; the AWS connection pools (AWS_MAX_POOL_CONNECTIONS) are per worker.
+#   --max-requests 2000 keeps slow leaks in check; idle keep-alive connections of a recycled
+#              worker are closed, which browsers and load balancers retry transparently.
+
+# every setting can also come from the environment, e.g. in a container
+DEFAULT_BIND = os.environ.get('CLAIMSURE_BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+DEFAULT_WORKERS = int(os.environ.get('WEB_CONCURRENCY', max(2, os.cpu_count() or 1)))
+DEFAULT_THREADS = int(os.environ.get('CLAIMSURE_THREADS', 8))
+DEFAULT_MAX_REQUESTS = int(os.environ.get('CLAIMSURE_MAX_REQUESTS', 2000))
+DEFAULT_PID_FILE = os.environ.get('CLAIMSURE_PID_FILE', '/tmp/claimsure.pid')
+
+# seconds a worker gets to finish its requests when it is stopped or replaced
+GRACEFUL_TIMEOUT = 30
+
+# seconds `reload` waits for the new master and its workers before giving up
+RELOAD_TIMEOUT = 60
+
+
+# function to set up a worker right after it is forked: the upload janitor's thread would
+# not survive the fork, so every worker starts its own; resources are read again, so a
+# HUP picks up the manifest written by a new `provision.py apply`
+def _post_fork(server, worker):
+    from components.resources import reset_resources
+    from components.upload_sessions import start_upload_janitor
+    reset_resources()
+    start_upload_janitor()
+
+
+def _options(args):
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'preload_app': True,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'keepalive': 5,
+        'pidfile': args.pid_file,
+        'accesslog': '-',
+        'post_fork': _post_fork,
+    }
+
+
+def serve(args):
+    from gunicorn.app.base import BaseApplication
+
+    class ClaimSureApplication(BaseApplication):
+        """Runs the app in gunicorn with the settings given on the command line."""
+
+        def load_config(self):
+            for name, value in _options(args).items():
+                self.cfg.set(name, value)
+
+        # runs once in the master with preload_app, before the workers are forked
+        def load(self):
+            from app import create_app
+            from components.aws_clients import preload_clients
+            app = create_app({'START_UPLOAD_JANITOR': False})  # started in each worker instead
+            preload_clients()
+            return app
+
+    ClaimSureApplication().run()
+
+
+def _read_pid(pid_file):
+    try:
+        with open(pid_file) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _worker_count(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return len(f.read().split())
+    except OSError:
+        return None
+
+
+# function to switch a running server to new code: USR2 makes gunicorn start a new master from
+# the current code, which writes its pid to <pid file>.2; both accept on the same socket until
+# the old master is told to stop gracefully, and the new one then takes over the pid file
+def reload(pid_file):
+    old_pid = _read_pid(pid_file)
+    if old_pid is None:
+        raise Exception(f"Error reloading: no server pid in {pid_file}")
+    workers = _worker_count(old_pid)  # the new master starts as many
+    os.kill(old_pid, signal.SIGUSR2)
+
+    deadline = time.monotonic() + RELOAD_TIMEOUT
+    new_pid = None
+    while time.monotonic() < deadline:
+        new_pid = _read_pid(f"{pid_file}.2")
+        if new_pid:
+            count = _worker_count(new_pid)
+            if count is None or workers is None or count >= workers:
+                break
+        time.sleep(0.5)
+    else:
+        raise Exception(f"Error reloading: the new master did not start within {RELOAD_TIMEOUT}s, "
+                        f"the old one ({old_pid}) keeps serving")
+
+    if _worker_count(new_pid) is None or workers is None:
+        time.sleep(5)  # no /proc to count the new workers, give them a moment
+    os.kill(old_pid, signal.SIGTERM)
+    print(f"Reloaded: master {new_pid} is serving, {old_pid} is finishing its requests.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve ClaimSure with a pre-forking WSGI server.")
+    parser.add_argument('command', nargs='?', choices=['serve', 'reload'], default='serve')
+    parser.add_argument('--bind', default=DEFAULT_BIND)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="worker processes")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="request threads per worker")
+    parser.add_argument('--max-requests', type=int, default=DEFAULT_MAX_REQUESTS,
+                        help="requests after which a worker is replaced, 0 to never replace them")
+    parser.add_argument('--pid-file', default=DEFAULT_PID_FILE)
+    args = parser.parse_args()
+
+    if args.command == 'reload':
+        reload(args.pid_file)
+    else:
+        serve(args)
@@ -1,6 +1,13 @@
 import React, { useState, useEffect } from 'react';
 import './ManageClaim.css';
 
+// function for showing an attachment size in a readable unit
+const formatFileSize = (bytes) => {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+  return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+};
+
 const ManageClaims = () => {
   // Function for managing claims: storing claims, load status, errors, and data for editing
   const [claims, setClaims] = useState([]);
@@ -8,6 +15,10 @@ const ManageClaims = () => {
   const [error, setError] = useState(null);
   const [editingClaim, setEditingClaim] = useState(null);
   const [editedData, setEditedData] = useState({});
+
+  // Cursor for the next page of claims (null when every page has been loaded)
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   // State to hold count of claims due in the next 30 days
   const [dueClaimsCount, setDueClaimsCount] = useState(null);
@@ -40,6 +51,7 @@ const ManageClaims = () => {
 
         if (response.ok) {
           setClaims(data.claims);
+          setNextCursor(data.next_cursor || null);
         } else {
           setError(data.error || "No claims.");
         }
@@ -53,6 +65,31 @@ const ManageClaims = () => {
     fetchClaims();
   }, []); // Empty dependency array to run only once
 
+  // Function to fetch the next page of claims and append it to the list
+  const handleLoadMore = async () => {
+    const userId = localStorage.getItem('user_id');
+    if (!userId || !nextCursor) {
+      return;
+    }
+
+    setLoadingMore(true);
+    try {
+      const response = await fetch(`${baseURL}/claims/get-claims?user_id=${userId}&cursor=${encodeURIComponent(nextCursor)}`);
+      const data = await response.json();
+
+      if (response.ok) {
+        setClaims((previousClaims) => [...previousClaims, ...data.claims]);
+        setNextCursor(data.next_cursor || null);
+      } else {
+        setError(data.error || "Failed to load more claims.");
+      }
+    } catch (error) {
+      setError("An error occurred while fetching claims.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // hook to fetch claims due in the next 30 days
   useEffect(() => {
     const fetchClaimsDueCount = async () => {
@@ -88,7 +125,7 @@ const ManageClaims = () => {
       });
 
       if (response.ok) {
-        setClaims(claims.filter(claim => claim.ClaimID.S !== claimId));
+        setClaims(claims.filter(claim => claim.id !== claimId));
       } else {
         const data = await response.json();
         setError(data.error || "Failed to delete the claim.");
@@ -100,11 +137,11 @@ const ManageClaims = () => {
 
   // Function to handle claim edits
   const handleEdit = (claim) => {
-    setEditingClaim(claim.ClaimID.S);
+    setEditingClaim(claim.id);
     setEditedData({
-      ClaimTitle: claim.ClaimTitle.S,
-      ClaimType: claim.ClaimType.S,
-      ClaimDetails: claim.ClaimDetails.S
+      ClaimTitle: claim.title,
+      ClaimType: claim.type,
+      ClaimDetails: claim.details
     });
   };
 
@@ -123,11 +160,11 @@ const ManageClaims = () => {
       });
 
       if (response.ok) {
-        setClaims(claims.map(claim => claim.ClaimID.S === editingClaim ? {
+        setClaims(claims.map(claim => claim.id === editingClaim ? {
           ...claim,
-          ClaimTitle: { S: editedData.ClaimTitle },
-          ClaimType: { S: editedData.ClaimType },
-          ClaimDetails: { S: editedData.ClaimDetails }
+          title: editedData.ClaimTitle,
+          type: editedData.ClaimType,
+          details: editedData.ClaimDetails
         } : claim));
         setEditingClaim(null);
       } else {
@@ -154,6 +191,13 @@ const ManageClaims = () => {
         <p>Claims due in next 30 days: {dueClaimsCount}</p>
       )}
 
+      {/* Download all claims and their files as one zip archive */}
+      {claims.length > 0 && (
+        <a href={`${baseURL}/attachments/export?user_id=${encodeURIComponent(localStorage.getItem('user_id'))}`}>
+          Export all claims
+        </a>
+      )}
+
       {loading ? (
         <p>Loading claims...</p>
       ) : error ? (
@@ -177,20 +221,20 @@ const ManageClaims = () => {
               </thead>
               <tbody>
                 {claims.map((claim) => (
-                  <tr key={claim.ClaimID.S}>
+                  <tr key={claim.id}>
                     <td>
-                      {editingClaim === claim.ClaimID.S ? (
+                      {editingClaim === claim.id ? (
                         <input
                           type="text"
                           value={editedData.ClaimTitle}
                           onChange={(e) => setEditedData({ ...editedData, ClaimTitle: e.target.value })}
                         />
                       ) : (
-                        claim.ClaimTitle.S
+                        claim.title
                       )}
                     </td>
                     <td>
-                      {editingClaim === claim.ClaimID.S ? (
+                      {editingClaim === claim.id ? (
                         <select
                           value={editedData.ClaimType}
                           onChange={(e) => setEditedData({ ...editedData, ClaimType: e.target.value })}
@@ -200,31 +244,43 @@ const ManageClaims = () => {
                           ))}
                         </select>
                       ) : (
-                        claim.ClaimType.S
+                        claim.type
                       )}
                     </td>
                     <td>
-                      {editingClaim === claim.ClaimID.S ? (
+                      {editingClaim === claim.id ? (
                         <input
                           type="text"
                           value={editedData.ClaimDetails}
                           onChange={(e) => setEditedData({ ...editedData, ClaimDetails: e.target.value })}
                         />
                       ) : (
-                        claim.ClaimDetails.S
+                        claim.details
                       )}
                     </td>
                     <td>
-                      {claim.FileURL.S ? (
-                        <a href={claim.FileURL.S} target="_blank" rel="noopener noreferrer">View File</a>
+                      {claim.attachments && claim.attachments.length > 0 ? (
+                        claim.attachments.map((attachment) => (
+                          <div key={attachment.url}>
+                            <a href={attachment.url} target="_blank" rel="noopener noreferrer">
+                              {attachment.name || 'View File'}
+                            </a>
+                            {attachment.size ? ` (${formatFileSize(attachment.size)})` : ''}
+                          </div>
+                        ))
                       ) : (
                         <span>No file</span>
                       )}
+                      {claim.attachments && claim.attachments.length > 1 && (
+                        <a href={`${baseURL}/attachments/export?user_id=${encodeURIComponent(localStorage.getItem('user_id'))}&claim_id=${claim.id}`}>
+                          Download all
+                        </a>
+                      )}
                     </td>
-                    <td>{claim.submission_date}</td>
-                    <td>{claim.due_date}</td>
+                    <td>{claim.submitted || 'N/A'}</td>
+                    <td>{claim.due || 'N/A'}</td>
                     <td>
-                      {editingClaim === claim.ClaimID.S ? (
+                      {editingClaim === claim.id ? (
                         <div className="icon-container">
                           <span className="icon" onClick={handleSave}>✔️</span>
                           <span className="icon" onClick={handleCancel}>❌</span>
@@ -232,7 +288,7 @@ const ManageClaims = () => {
                       ) : (
                         <div className="icon-container">
                           <span className="icon" onClick={() => handleEdit(claim)}>✏️</span>
-                          <span className="icon" onClick={() => handleDelete(claim.ClaimID.S)}>🗑️</span>
+                          <span className="icon" onClick={() => handleDelete(claim.id)}>🗑️</span>
                         </div>
                       )}
                     </td>
@@ -241,6 +297,11 @@ const ManageClaims = () => {
               </tbody>
             </table>
           )}
+          {nextCursor && (
+            <button onClick={handleLoadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more claims'}
+            </button>
+          )}
         </div>
       )}
     </div>
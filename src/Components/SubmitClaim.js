@@ -8,7 +8,7 @@ const SubmitClaim = () => {
   const [claimTitle, setClaimTitle] = useState('');
   const [claimType, setClaimType] = useState('');
   const [claimDetails, setClaimDetails] = useState('');
-  const [file, setFile] = useState(null);
+  const [files, setFiles] = useState([]);
   const [uploading, setUploading] = useState(false);
   const navigate = useNavigate();
 
@@ -16,17 +16,26 @@ const SubmitClaim = () => {
     ? 'http://localhost:5000'
     : 'http://claim-lb-2074056079.us-east-1.elb.amazonaws.com';  
 
+  // a claim can have up to this many attachments, uploaded a few at a time
+  const MAX_ATTACHMENTS = 20;
+  const PARALLEL_UPLOADS = 3;
+
   // function for handling file change
   const handleFileChange = (e) => {
-    const newFile = e.target.files[0];
+    const newFiles = Array.from(e.target.files);
+
+    if (newFiles.length > MAX_ATTACHMENTS) {
+      alert(`You can attach at most ${MAX_ATTACHMENTS} files to a claim.`);
+      return;
+    }
 
-    // If file size is greater than 50MB, inform  user
-    if (newFile && newFile.size > 50 * 1024 * 1024) {
+    // If any file size is greater than 50MB, inform  user
+    if (newFiles.some((newFile) => newFile.size > 50 * 1024 * 1024)) {
       alert("File size exceeds 50MB. Please upload a smaller file.");
       return;
     }
 
-    setFile(newFile);
+    setFiles(newFiles);
   };
 
   // function for handling form submission
@@ -40,20 +49,17 @@ const SubmitClaim = () => {
       return;
     }
 
-    // Prepare the data for the form to be sent to backend
+    // Prepare the claim data for the backend, the files go straight to S3
     const formData = new FormData();
     formData.append('user_id', userId);
     formData.append('claimTitle', claimTitle);
     formData.append('claimType', claimType);
     formData.append('claimDetails', claimDetails);
-    if (file) {
-      formData.append('file', file);
-    }
 
     setUploading(true);  
 
     try {
-      // Submit the claim data and file to the backend
+      // Submit the claim data to the backend
       const response = await fetch(`${BASE_URI}/claims/submit-claim`, {
         method: 'POST',
         body: formData,  
@@ -61,12 +67,22 @@ const SubmitClaim = () => {
 
       const data = await response.json();
 
-      if (response.ok) {
-        alert('Claim submitted successfully!');
-        navigate('/manage-claims');
-      } else {
+      if (!response.ok) {
         alert("Error submitting claim: " + data.error);
+        return;
       }
+
+      // upload the attachments with a few requests in flight at a time
+      const queue = [...files];
+      const uploadNext = async () => {
+        while (queue.length > 0) {
+          await uploadAttachment(userId, data.claim_id, queue.shift());
+        }
+      };
+      await Promise.all(Array.from({ length: Math.min(PARALLEL_UPLOADS, files.length) }, uploadNext));
+
+      alert('Claim submitted successfully!');
+      navigate('/manage-claims');
     } catch (error) {
       console.error("Error submitting claim:", error);
       alert("An error occurred while submitting the claim.");
@@ -75,6 +91,106 @@ const SubmitClaim = () => {
     }
   };
 
+  // function for attaching a file, reusing a copy the user already uploaded when there is one
+  const uploadAttachment = async (userId, claimId, attachment) => {
+    // hashing needs a secure context, without it the file goes straight to S3
+    if (!window.crypto || !window.crypto.subtle) {
+      return uploadAttachmentToS3(userId, claimId, attachment);
+    }
+
+    const digest = await window.crypto.subtle.digest('SHA-256', await attachment.arrayBuffer());
+    const sha256 = Array.from(new Uint8Array(digest))
+      .map((byte) => byte.toString(16).padStart(2, '0'))
+      .join('');
+
+    // if the same file is already stored it is attached without uploading it again
+    const contentType = attachment.type || 'application/pdf';
+    const checkResponse = await fetch(`${BASE_URI}/attachments/blobs/check`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        user_id: userId,
+        claim_id: claimId,
+        sha256,
+        filename: attachment.name,
+        content_type: contentType
+      })
+    });
+    const check = await checkResponse.json();
+    if (!checkResponse.ok) {
+      throw new Error(check.error);
+    }
+    if (check.deduplicated) {
+      return;
+    }
+
+    // new files go straight to S3 with the upload policy of the check, then the backend
+    // moves them into the shared store so later claims can reuse them
+    const uploadData = new FormData();
+    Object.entries(check.upload.fields).forEach(([name, value]) => uploadData.append(name, value));
+    uploadData.append('file', attachment);
+
+    const uploadResponse = await fetch(check.upload.url, { method: 'POST', body: uploadData });
+    if (!uploadResponse.ok) {
+      throw new Error("Upload to S3 failed");
+    }
+
+    const finalizeResponse = await fetch(`${BASE_URI}/attachments/blobs/finalize`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        user_id: userId,
+        claim_id: claimId,
+        key: check.upload.key,
+        filename: attachment.name
+      })
+    });
+    if (!finalizeResponse.ok) {
+      const finalize = await finalizeResponse.json();
+      throw new Error(finalize.error);
+    }
+  };
+
+  // function for uploading the attachment directly to S3 with a presigned POST policy
+  const uploadAttachmentToS3 = async (userId, claimId, attachment) => {
+    // ask the backend for an upload policy scoped to this claim
+    const presignResponse = await fetch(`${BASE_URI}/attachments/presign-post`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        user_id: userId,
+        claim_id: claimId,
+        filename: attachment.name,
+        content_type: attachment.type || 'application/pdf'
+      })
+    });
+    const presign = await presignResponse.json();
+    if (!presignResponse.ok) {
+      throw new Error(presign.error);
+    }
+
+    // the policy fields must come before the file in the form
+    const uploadData = new FormData();
+    Object.entries(presign.fields).forEach(([name, value]) => uploadData.append(name, value));
+    uploadData.append('file', attachment);
+
+    const uploadResponse = await fetch(presign.url, { method: 'POST', body: uploadData });
+    if (!uploadResponse.ok) {
+      throw new Error("Upload to S3 failed");
+    }
+
+    // record the uploaded file on the claim
+    const finalizeResponse = await fetch(`${BASE_URI}/attachments/finalize`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ user_id: userId, claim_id: claimId, key: presign.key })
+    });
+    if (!finalizeResponse.ok) {
+      const finalize = await finalizeResponse.json();
+      throw new Error(finalize.error);
+    }
+  };
+
   return (
     // html components for home page and submit claims form
     <div className="submit-claim-container">
@@ -117,11 +233,12 @@ const SubmitClaim = () => {
             ></textarea>
             <input
               type="file"
+              multiple
               onChange={handleFileChange}
             />
-            {file && (
+            {files.length > 0 && (
               <p className="file-info-text">
-                Upload only one consolidated PDF under 50MB. If you want to select another file, click on "Choose file" again.
+                {files.length} file(s) selected, each under 50MB. If you want to select other files, click on "Choose files" again.
               </p>
             )}
             <button id="submitBtn" type="submit" disabled={uploading}>